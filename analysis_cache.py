@@ -0,0 +1,56 @@
+import hashlib
+import os
+import pickle
+
+from cache_store import CacheStore
+
+ANALYSIS_CACHE_FILE="cache/analysis_cache.sqlite"
+
+def fingerprint(value):
+    return hashlib.sha256(pickle.dumps(value)).hexdigest()
+
+def fingerprint_inputs(steam_db, gpu_db, gpu_benchmark_db):
+
+    # Everything a target's analysis depends on besides the target itself:
+    #   the survey snapshot as analyzed, and the versions of both GPU caches
+    steam_snapshot = sorted((steam_db_card.name, steam_db_card.popularity) for steam_db_card in steam_db.iter())
+    return fingerprint((steam_snapshot, gpu_db.store.version() if gpu_db != None else None, gpu_benchmark_db.store.version()))
+
+def fingerprint_target_configuration(target_configuration):
+    return fingerprint((target_configuration.gpu_name, target_configuration.min_vram_bytes, target_configuration.min_tflops, target_configuration.memory_types))
+
+class AnalysisCache:
+    def __init__(self, inputs_fingerprint):
+        self.inputs_fingerprint = inputs_fingerprint
+        self.store = CacheStore(ANALYSIS_CACHE_FILE)
+        self.new_entries = dict()
+
+    def key(self, target_configuration):
+        return f"target/{target_configuration.name}"
+
+    def get(self, target_configuration):
+
+        # Returns the market share if the target was analyzed against the same inputs before
+        # Entries that also carry eligible card ids were written by an older version, and are analyzed again
+        found, entry = self.store.get(self.key(target_configuration))
+        if not found or len(entry) != 3:
+            return None
+        (inputs_fingerprint, target_fingerprint, market_share) = entry
+        if inputs_fingerprint != self.inputs_fingerprint or target_fingerprint != fingerprint_target_configuration(target_configuration):
+            return None
+        return market_share
+
+    def add(self, target_configuration, market_share):
+        self.new_entries[self.key(target_configuration)] = (self.inputs_fingerprint, fingerprint_target_configuration(target_configuration), market_share)
+
+    def is_output_up_to_date(self, target_configuration_db, output_files):
+        found, output_fingerprint = self.store.get("output")
+        return found and output_fingerprint == self.output_fingerprint(target_configuration_db, output_files) and all(os.path.exists(output_file) for output_file in output_files)
+
+    def output_fingerprint(self, target_configuration_db, output_files):
+        return fingerprint((self.inputs_fingerprint, [(target_configuration_name, fingerprint_target_configuration(target_configuration)) for target_configuration_name, target_configuration in target_configuration_db.items()], output_files))
+
+    def write_cache(self, target_configuration_db, output_files):
+        self.new_entries["output"] = self.output_fingerprint(target_configuration_db, output_files)
+        self.store.put_many(self.new_entries)
+        self.new_entries = dict()
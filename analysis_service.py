@@ -0,0 +1,270 @@
+import argparse
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+from analyze import create_cards, get_card_requirements
+from cache_store import CacheStore
+from card_index import CardIndex, CardRequirements
+from gpu_architecture_db import GPU_ARCHITECTURE_DB_CACHE_FILE, GPUArchitectureDB
+from gpu_benchmark_db import GPU_BENCHMARK_DB_CACHE_FILE, GPUBenchmarkDB
+from instrumentation import INSTRUMENTATION, count, span
+from min_spec import solve_min_spec
+from source_loader import load_sources
+from steam_db import STEAM_DB_INDEX_FILE, SteamDB
+from target_configuration_db import TARGET_CONFIGURATIONS_FILE, TargetConfiguration, TargetConfigurationDB
+
+ANALYSIS_SERVICE_HOST="127.0.0.1"
+ANALYSIS_SERVICE_PORT=8765
+ANALYSIS_SERVICE_RELOAD_INTERVAL_SECONDS=30
+
+# Caches whose version token changes whenever another run refreshes them
+ANALYSIS_SERVICE_WATCHED_STORES=[STEAM_DB_INDEX_FILE, GPU_BENCHMARK_DB_CACHE_FILE, GPU_ARCHITECTURE_DB_CACHE_FILE]
+
+class AnalysisState:
+    def __init__(self, steam_db, gpu_db, gpu_benchmark_db, target_configuration_db):
+
+        # Everything a query needs, joined and indexed once; a reload builds a new state and swaps it in whole,
+        #   so each request sees a single consistent state without taking a lock
+        self.source_versions = None
+        self.load_time = time.time()
+        self.target_configuration_db = target_configuration_db
+
+        # Same as analyze.py: the "Other" category is about 10%, and would skew market share
+        steam_db.remove("Other")
+
+        self.cards = create_cards(steam_db, gpu_db, gpu_benchmark_db)
+        with span("card_index"):
+            self.card_index = CardIndex(self.cards)
+
+        # Coverage curves by requirements, built on first use; a min spec query is then a bisect on its curve
+        self.coverage_curves = dict()
+        self.coverage_curves_lock = threading.Lock()
+
+    def coverage_curve(self, requirements):
+        key = (requirements.min_vram_bytes, requirements.min_tflops, tuple(sorted(requirements.memory_types)) if requirements.memory_types != None else None)
+        curve = self.coverage_curves.get(key)
+        if curve == None:
+            with self.coverage_curves_lock:
+                curve = self.coverage_curves.get(key)
+                if curve == None:
+                    curve = self.card_index.coverage_curve(requirements)
+                    self.coverage_curves[key] = curve
+        return curve
+
+class AnalysisService:
+    def __init__(self, reload_interval=ANALYSIS_SERVICE_RELOAD_INTERVAL_SECONDS):
+        self.reload_interval = reload_interval
+        self.stores = [CacheStore(path) for path in ANALYSIS_SERVICE_WATCHED_STORES]
+        self.state = None
+        self.reload_count = 0
+        self.reload_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def source_versions(self):
+        target_configurations_time = os.path.getmtime(TARGET_CONFIGURATIONS_FILE) if os.path.exists(TARGET_CONFIGURATIONS_FILE) else None
+        return [store.version() for store in self.stores] + [target_configurations_time]
+
+    def reload(self):
+
+        # Loading sources may itself update the caches (e.g. architecture DB misses), so versions are read once the new state is built
+        with self.reload_lock, span("analysis_service.reload"):
+            loaded_sources = load_sources([("SteamDB", SteamDB), ("GPUBenchmarkDB", GPUBenchmarkDB), ("TargetConfigurationDB", TargetConfigurationDB), ("GPUArchitectureDB", GPUArchitectureDB)])
+            failed_sources = [name for (name, source) in loaded_sources.items() if source == None and name != "GPUArchitectureDB"]
+            if len(failed_sources) > 0:
+                raise Exception(f"Unable to analyze without {', '.join(failed_sources)}")
+
+            state = AnalysisState(loaded_sources["SteamDB"], loaded_sources.get("GPUArchitectureDB"), loaded_sources["GPUBenchmarkDB"], loaded_sources["TargetConfigurationDB"])
+            state.source_versions = self.source_versions()
+            self.state = state
+            self.reload_count += 1
+            print(f"Analysis state loaded, {len(state.cards)} cards")
+
+    def watch(self):
+
+        # Polls the watched caches, and rebuilds the state in the background when one has changed
+        # Requests keep being answered from the previous state until the new one is ready, or if the reload fails
+        while not self.stopped.wait(self.reload_interval):
+            try:
+                if self.source_versions() != self.state.source_versions:
+                    print("Sources changed, reloading")
+                    self.reload()
+            except Exception as e:
+                print(f"Reload failed, still serving the previous state: {e!r}")
+                count("analysis_service.reload_errors")
+
+    def start_watching(self):
+        watcher = threading.Thread(target=self.watch, name="analysis_service.watch", daemon=True)
+        watcher.start()
+        return watcher
+
+    def stop(self):
+        self.stopped.set()
+
+def first_parameter(parameters, name, parser=str):
+    values = parameters.get(name)
+    if values == None:
+        return None
+    try:
+        return parser(values[0])
+    except ValueError:
+        raise Exception(f"Invalid value for {name}: {values[0]}")
+
+def parse_memory_types(parameters):
+    memory_types = first_parameter(parameters, "memory_types")
+    return memory_types.split(",") if memory_types != None else None
+
+def parse_min_vram_bytes(parameters):
+    min_vram_gb = first_parameter(parameters, "min_vram_gb", float)
+    return int(min_vram_gb * 1024 * 1024 * 1024) if min_vram_gb != None else None
+
+def parse_target_configuration(state, parameters):
+
+    # Either a configuration from input/target_configurations.json by name, or a GPU name with optional extra requirements
+    target_name = first_parameter(parameters, "target")
+    if target_name != None:
+        target_configuration = state.target_configuration_db.configs.get(target_name)
+        if target_configuration == None:
+            raise Exception(f"Unknown target configuration {target_name}")
+        return target_configuration
+
+    gpu_name = first_parameter(parameters, "gpu")
+    if gpu_name == None:
+        raise Exception("Either target or gpu is required")
+    return TargetConfiguration(gpu_name, gpu_name,
+        min_vram_bytes=parse_min_vram_bytes(parameters),
+        min_tflops=first_parameter(parameters, "min_tflops", float),
+        memory_types=parse_memory_types(parameters))
+
+def card_summary(card):
+    return {"card_id": card.card_id,
+        "g3d_mark": card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else None,
+        "popularity": card.steam_card.popularity if card.steam_card != None else None,
+        "architecture": card.gpu_architecture_db_card.describe() if card.gpu_architecture_db_card != None else None}
+
+def query_coverage(state, parameters):
+    if not "target" in parameters and not "gpu" in parameters:
+        results = dict()
+        for target_configuration_name, target_configuration in state.target_configuration_db.items():
+            try:
+                results[target_configuration_name] = state.card_index.query_market_share(get_card_requirements(target_configuration, state.cards))
+            except Exception:
+                results[target_configuration_name] = None
+        return {"market_shares": results}
+
+    target_configuration = parse_target_configuration(state, parameters)
+    return {"target": str(target_configuration), "market_share": state.card_index.query_market_share(get_card_requirements(target_configuration, state.cards))}
+
+def query_eligible(state, parameters):
+    target_configuration = parse_target_configuration(state, parameters)
+    requirements = get_card_requirements(target_configuration, state.cards)
+    eligible_cards = state.card_index.query(requirements)
+    limit = first_parameter(parameters, "limit", int)
+
+    # Weakest eligible cards first, as those are the ones closest to the cut
+    return {"target": str(target_configuration), "market_share": state.card_index.query_market_share(requirements), "count": len(eligible_cards),
+        "cards": [card_summary(card) for card in (eligible_cards[:limit] if limit != None else eligible_cards)]}
+
+def query_min_spec(state, parameters):
+    coverage_goal = first_parameter(parameters, "coverage", float)
+    if coverage_goal == None:
+        raise Exception("coverage is required")
+    requirements = CardRequirements(min_vram_bytes=parse_min_vram_bytes(parameters), min_tflops=first_parameter(parameters, "min_tflops", float), memory_types=parse_memory_types(parameters))
+    min_spec_solution = solve_min_spec(state.coverage_curve(requirements), coverage_goal, requirements)
+    return {"coverage_goal": coverage_goal, "market_share": min_spec_solution.market_share,
+        "card": card_summary(min_spec_solution.card) if min_spec_solution.card != None else None}
+
+def query_status(service, state, parameters):
+    return {"load_time": state.load_time, "reload_count": service.reload_count, "card_count": len(state.cards),
+        "target_configuration_count": len(state.target_configuration_db.configs), "counters": INSTRUMENTATION.report()["counters"]}
+
+ANALYSIS_SERVICE_QUERIES={
+    "/coverage": lambda service, state, parameters: query_coverage(state, parameters),
+    "/eligible": lambda service, state, parameters: query_eligible(state, parameters),
+    "/min-spec": lambda service, state, parameters: query_min_spec(state, parameters),
+    "/status": query_status,
+}
+
+class AnalysisRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    # Keep-alive, so a client can send many queries over one connection
+    # Headers and body go out as separate writes, which Nagle's algorithm would otherwise hold back until the client's delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = ANALYSIS_SERVICE_QUERIES.get(url.path)
+        if query == None:
+            self.send_json(404, {"error": f"Unknown query {url.path}, expected one of {', '.join(ANALYSIS_SERVICE_QUERIES.keys())}"})
+            return
+
+        # The state is read once per request, so a reload swapping it halfway through doesn't mix two states
+        state = self.server.service.state
+        count(f"analysis_service.requests{url.path}")
+        try:
+            with span(f"analysis_service.query{url.path}"):
+                result = query(self.server.service, state, urllib.parse.parse_qs(url.query))
+        except Exception as e:
+            count("analysis_service.bad_requests")
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(200, result)
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/reload":
+            self.send_json(404, {"error": f"Unknown command {self.path}"})
+            return
+
+        # Reloads in the background, like a detected source change
+        threading.Thread(target=self.server.service.reload, name="analysis_service.reload", daemon=True).start()
+        self.send_json(202, {"reloading": True})
+
+    def send_json(self, status, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Requests are counted and timed in the run report rather than logged one line each
+    def log_message(self, format, *args):
+        pass
+
+class AnalysisServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, AnalysisRequestHandler)
+        self.service = service
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep the joined cards and indexes in memory, and answer coverage, eligible-card and min spec queries over local HTTP")
+    parser.add_argument("--host", default=ANALYSIS_SERVICE_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=ANALYSIS_SERVICE_PORT, help="port to listen on")
+    parser.add_argument("--reload-interval", type=float, default=ANALYSIS_SERVICE_RELOAD_INTERVAL_SECONDS, help="seconds between checks for refreshed caches")
+    args = parser.parse_args()
+
+    service = AnalysisService(reload_interval=args.reload_interval)
+    try:
+        service.reload()
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+    service.start_watching()
+
+    server = AnalysisServer((args.host, args.port), service)
+    print(f"Serving on http://{args.host}:{args.port}, queries: {', '.join(ANALYSIS_SERVICE_QUERIES.keys())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        INSTRUMENTATION.write_report()
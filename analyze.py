@@ -1,15 +1,26 @@
-import csv
-from tabulate import tabulate
-
+import argparse
+import numpy
+import sys
+
+from analysis_cache import AnalysisCache, fingerprint_inputs
+from card_index import CardIndex, CardRequirements
+from card_name_resolver import CardNameResolver
+from card_table import CardTable
+from component_coverage import COMPONENT_COVERAGE_FILE, JOINT_MODEL_DEFAULT, JOINT_MODELS, analyze_component_coverage, write_component_coverage_csv
+from coverage_uncertainty import COVERAGE_UNCERTAINTY_CONFIDENCE, COVERAGE_UNCERTAINTY_FILE, COVERAGE_UNCERTAINTY_RESAMPLES, COVERAGE_UNCERTAINTY_SAMPLE_SIZE, analyze_coverage_uncertainty, write_coverage_uncertainty_csv
 from gpu_architecture_db import GPUArchitectureDB, GPUArchitectureDBEntry
 from gpu_benchmark_db import GPUBenchmarkDB, GPUBenchmarkDBEntry
+from instrumentation import INSTRUMENTATION, PROFILE_FILE, count, profile, span, timed
+from min_spec import MIN_SPEC_CURVE_FILE, describe_min_spec, find_min_spec, write_min_spec_curve_csv
+from output_writers import OUTPUT_FORMATS, is_parquet_available, output_files, write_outputs
+from source_loader import load_sources
 from steam_db import SteamDB
 from target_configuration_db import TargetConfigurationDB
-
-TARGET_CONFIGURATIONS_FILE="output/target_configurations.csv"
-ALL_CARDS_FILE="output/all_cards.csv"
+from trend_analysis import SurveyTrend, TREND_FILE, analyze_trend, write_trend_csv
 
 class Card:
+    __slots__ = ("card_id", "steam_card", "gpu_architecture_db_card", "gpu_benchmark_db_entry")
+
     def __init__(self, card_id, steam_card, gpu_architecture_db_card, gpu_benchmark_db_entry):
         self.card_id = card_id
         self.steam_card = steam_card
@@ -19,140 +30,225 @@ class Card:
     def __str__(self):
         return f"{self.card_id}: Steam: [{self.steam_card}], GPUArchitectureDB: [{self.gpu_architecture_db_card}], GPU Benchmark DB: [{self.gpu_benchmark_db_entry}]"
 
+class Cards(dict):
+    def __init__(self):
+        super().__init__()
+
+        # PassMark card id -> card, for PassMark cards joined to a Steam card of another name, so targets can name either
+        self.aliases = dict()
+
+    def find(self, card_id):
+        card = self.get(card_id)
+        return card if card != None else self.aliases.get(card_id)
+
+@timed("create_cards")
 def create_cards(steam_db, gpu_db, gpu_benchmark_db):
-    results = dict()
+    results = Cards()
+
+    # Map each Steam card to a PassMark card and a GPU architecture DB name
+    # PassMark cards that no Steam card maps to are included on their own
+    # Without a GPU architecture DB (e.g. it failed to load), cards are joined without architecture data
+    benchmark_card_ids = list(gpu_benchmark_db.card_ids())
+    card_name_resolver = CardNameResolver(benchmark_card_ids, gpu_db.card_names() if gpu_db != None else [])
+    steam_resolutions = {steam_db_card.name: card_name_resolver.resolve(steam_db_card.name) for steam_db_card in steam_db.iter()}
+    matched_benchmark_card_ids = set(benchmark_card_id for (benchmark_card_id, architecture_name) in steam_resolutions.values() if benchmark_card_id != None)
+    benchmark_resolutions = {card_id: card_name_resolver.resolve(card_id) for card_id in benchmark_card_ids if not card_id in matched_benchmark_card_ids}
+    card_name_resolver.write_cache()
+
+    if gpu_db != None:
+        gpu_db.prefetch_names([architecture_name for (benchmark_card_id, architecture_name) in list(steam_resolutions.values()) + list(benchmark_resolutions.values())])
 
     for steam_db_card in steam_db.iter():
         card_id = steam_db_card.name
-        gpu_architecture_db_card = gpu_db.get(card_id)
-        gpu_benchmark_db_card = gpu_benchmark_db.get(card_id)
+        benchmark_card_id, architecture_name = steam_resolutions[card_id]
+        gpu_architecture_db_card = gpu_db.get_by_name(architecture_name) if gpu_db != None else None
+        gpu_benchmark_db_card = gpu_benchmark_db.get(benchmark_card_id) if benchmark_card_id != None else None
         results[card_id] = Card(card_id=card_id, steam_card=steam_db_card, gpu_architecture_db_card=gpu_architecture_db_card, gpu_benchmark_db_entry=gpu_benchmark_db_card)
 
-    for card_id, gpu_benchmark_db_card in gpu_benchmark_db.items():
+        # When several Steam cards map to the same PassMark card, the first one in the survey is the one its id stands for
+        if benchmark_card_id != None and benchmark_card_id != card_id and not benchmark_card_id in results.aliases:
+            results.aliases[benchmark_card_id] = results[card_id]
+
+    for card_id, (benchmark_card_id, architecture_name) in benchmark_resolutions.items():
         if not card_id in results:
-            steam_db_card = steam_db.get(card_id)
-            gpu_architecture_db_card = gpu_db.get(card_id)
-            results[card_id] = Card(card_id=card_id, steam_card=steam_db_card, gpu_architecture_db_card=gpu_architecture_db_card, gpu_benchmark_db_entry=gpu_benchmark_db_card)
+            gpu_architecture_db_card = gpu_db.get_by_name(architecture_name) if gpu_db != None else None
+            results[card_id] = Card(card_id=card_id, steam_card=None, gpu_architecture_db_card=gpu_architecture_db_card, gpu_benchmark_db_entry=gpu_benchmark_db.get(card_id))
 
     return results
 
-def filter_cards_by_g3d_mark(target_card, cards):
-    return {card_id: card for (card_id, card) in cards.items() if (card.gpu_benchmark_db_entry != None) and (card.gpu_benchmark_db_entry.g3d_mark >= target_card.gpu_benchmark_db_entry.g3d_mark)}
-
-def get_eligible_cards(target_configuration, cards):
-    target_card = cards.get(target_configuration.gpu_name)
+def get_target_card(target_configuration, cards):
+    target_card = cards.find(target_configuration.gpu_name)
     if target_card == None:
-        raise f"Unable to find target GPU {target_configuration.gpu_name} among cards"
+        raise Exception(f"Unable to find target GPU {target_configuration.gpu_name} among cards")
+    return target_card
 
-    eligible_cards = filter_cards_by_g3d_mark(target_card, cards)
-    return eligible_cards
+def get_card_requirements(target_configuration, cards):
+    target_card = get_target_card(target_configuration, cards)
+    if target_card.gpu_benchmark_db_entry == None:
+        raise Exception(f"No benchmark data for target GPU {target_configuration.gpu_name}")
+    return CardRequirements(min_g3d_mark=target_card.gpu_benchmark_db_entry.g3d_mark,
+        min_vram_bytes=target_configuration.min_vram_bytes,
+        min_tflops=target_configuration.min_tflops,
+        memory_types=target_configuration.memory_types)
 
-def calculate_market_share(cards):
-    return sum(card.steam_card.popularity for card in cards.values() if card.steam_card != None)
+def get_target_requirements(target_configuration_db, cards):
 
-class CardAnalysis:
-    def __init__(self, eligible_cards, market_share):
-        self.eligible_cards = eligible_cards
-        self.market_share = market_share
-
-    def __str__(self):
-        return f"Cards: [{card.name for card in self.eligible_cards.keys()}] Market share: {self.market_share:.2f}"
-
-def analyze(target_configuration_db, cards):
-
-    results = dict()
+    # (target configuration, requirements) for every target, with None as the requirements of targets that can't be analyzed
+    results = []
     for target_configuration_name, target_configuration in target_configuration_db.items():
-
         try:
-            eligible_cards = get_eligible_cards(target_configuration, cards)
-            market_share = calculate_market_share(eligible_cards)
-            results[target_configuration.gpu_name] = CardAnalysis(eligible_cards=eligible_cards, market_share=market_share)
-        except:
-            pass
-
+            results.append((target_configuration, get_card_requirements(target_configuration, cards)))
+        except Exception as e:
+            print(f"Skipping target configuration {target_configuration_name}: {e}")
+            count("analyze.skipped_targets")
+            results.append((target_configuration, None))
     return results
 
-#####################
-
-def write_target_configurations_csv(target_configuration_db, cards, analyzed_cards):
-    results = []
-    for target_configuration_name, target_configuration in target_configuration_db.items():
-
-        card = cards.get(target_configuration.gpu_name)
-        if card != None:
-            analyzed_card = analyzed_cards.get(target_configuration.gpu_name)
-            market_share = f"{analyzed_card.market_share * 100:.2f}%"
-            g3d_mark = card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else None
-            gpu_description = card.gpu_architecture_db_card.describe() if card.gpu_architecture_db_card != None else None
-            results.append([target_configuration.name, target_configuration.gpu_name, gpu_description, market_share, g3d_mark])
-        else:
-            results.append([target_configuration.name, target_configuration.gpu_name, None, None, None])
-
-    with open(TARGET_CONFIGURATIONS_FILE, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(["Configuration", "GPU Name", "GPU description", "Market coverage", "G3D mark (performance metric)"])
-        for line in results:
-            writer.writerow(line)
-
-    print(f"Results written to {TARGET_CONFIGURATIONS_FILE}")
-
-    with open(TARGET_CONFIGURATIONS_FILE, 'rt') as csvfile:
-        print(tabulate(csv.reader(csvfile), headers="firstrow", tablefmt='fancy_grid'))
+class CardAnalysis:
+    def __init__(self, market_share, requirements, card_table):
+        self.market_share = market_share
+        self.requirements = requirements
+        self.card_table = card_table
 
-def write_all_cards_csv(target_configuration_db, cards, analyzed_cards):
+    def eligible_cards(self):
 
-    sorted_target_configuration_names = sorted(target_configuration_db.configs.keys())
+        # Built from the target's eligibility row when asked for, rather than kept for every analyzed target
+        return [self.card_table.cards[position] for position in numpy.flatnonzero(self.card_table.eligibility([self.requirements])[0])]
 
-    results = []
-    for card_id, card in cards.items():
-        g3d_mark = card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else None
-        gpu_description = card.gpu_architecture_db_card.describe() if card.gpu_architecture_db_card != None else None
-        popularity = f"{card.steam_card.popularity * 100:.2f}%" if card.steam_card != None else None
-        column_results = [card_id, gpu_description, popularity, g3d_mark]
+    def includes(self, card):
+        return self.requirements.matches(card)
 
-        for target_configuration_name in sorted_target_configuration_names:
-            target_configuration = target_configuration_db.configs.get(target_configuration_name)
-            analyzed_card = analyzed_cards.get(target_configuration.gpu_name)
-            included = "Yes" if analyzed_card != None and card_id in analyzed_card.eligible_cards else "No"
-            column_results.append(included)
+    def __str__(self):
+        return f"Cards: [{[card.card_id for card in self.eligible_cards()]}] Market share: {self.market_share:.2f}"
 
-        results.append(column_results)
+@timed("analyze")
+def analyze(target_configuration_db, cards, card_table, analysis_cache=None):
 
-    results = sorted(results, key=lambda column: float(column[3]) if column[3] != None else 0, reverse=True)
+    results = dict()
+    target_configurations = []
+    requirements_list = []
+    for target_configuration_name, target_configuration in target_configuration_db.items():
+        try:
+            requirements = get_card_requirements(target_configuration, cards)
+        except Exception as e:
+            print(f"Skipping target configuration {target_configuration_name}: {e}")
+            count("analyze.skipped_targets")
+            continue
+
+        # Targets analyzed against the same inputs in an earlier run are taken from the analysis cache
+        cached_analysis = analysis_cache.get(target_configuration) if analysis_cache != None else None
+        if cached_analysis != None:
+            results[target_configuration.name] = CardAnalysis(market_share=cached_analysis, requirements=requirements, card_table=card_table)
+        else:
+            requirements_list.append(requirements)
+            target_configurations.append(target_configuration)
 
-    header_results = ["Configuration", "GPU Description", "Popularity", "G3D mark (performance metric)"]
-    for target_configuration_name in sorted_target_configuration_names:
-        header_results.append(target_configuration_name)
+    if len(target_configurations) > 0:
 
-    results.insert(0, header_results)
+        # Market share for every remaining target, from targets x cards eligibility masks over the popularity vector, a chunk of targets at a time
+        market_shares = card_table.market_shares(requirements_list)
 
-    with open(ALL_CARDS_FILE, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        for line in results:
-            writer.writerow(line)
+        for target_configuration, requirements, market_share in zip(target_configurations, requirements_list, market_shares):
+            results[target_configuration.name] = CardAnalysis(market_share=float(market_share), requirements=requirements, card_table=card_table)
+            if analysis_cache != None:
+                analysis_cache.add(target_configuration, float(market_share))
 
-    print(f"Results written to {ALL_CARDS_FILE}")
+    print(f"Analyzed {len(target_configurations)} target configurations, {len(results) - len(target_configurations)} unchanged")
+    count("analyze.analyzed_targets", len(target_configurations))
+    count("analyze.unchanged_targets", len(results) - len(target_configurations))
 
-    with open(ALL_CARDS_FILE, 'rt') as csvfile:
-        print(tabulate(csv.reader(csvfile), headers="firstrow", tablefmt='fancy_grid'))
+    return results
 
 if __name__ == '__main__':
-    print("Initializing SteamDB")
-    steam_db = SteamDB()
-    print("Initializing GPUArchitectureDB")
-    gpu_db = GPUArchitectureDB()
-    print("Initializing GPUBenchmarkDB")
-    gpu_benchmark_db = GPUBenchmarkDB()
-    print("Initializing TargetConfigurationDB")
-    target_configuration_db = TargetConfigurationDB()
+    parser = argparse.ArgumentParser(description="Compute what % of Steam's userbase is covered by each target configuration")
+    parser.add_argument("--trend", action="store_true", help=f"compute coverage for every survey month and write it to {TREND_FILE}")
+    parser.add_argument("--format", nargs="+", choices=OUTPUT_FORMATS, default=["csv"], help="formats for the all-cards table; the target configurations table is always written as CSV")
+    parser.add_argument("--console-rows", type=int, default=20, help="number of all-cards rows to print to the console; 0 prints no tables")
+    parser.add_argument("--full", action="store_true", help="re-analyze all target configurations and rewrite all outputs, even if their inputs are unchanged")
+    parser.add_argument("--profile", action="store_true", help=f"run the analysis under cProfile and write the stats to {PROFILE_FILE}")
+    parser.add_argument("--uncertainty", action="store_true", help=f"resample the survey to estimate confidence intervals for each target's market coverage, and write them to {COVERAGE_UNCERTAINTY_FILE}")
+    parser.add_argument("--resamples", type=int, default=COVERAGE_UNCERTAINTY_RESAMPLES, help="number of survey resamples for --uncertainty")
+    parser.add_argument("--sample-size", type=int, default=COVERAGE_UNCERTAINTY_SAMPLE_SIZE, help="assumed number of survey respondents for --uncertainty")
+    parser.add_argument("--confidence", type=float, default=COVERAGE_UNCERTAINTY_CONFIDENCE, help="confidence level of the intervals for --uncertainty")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to spread --uncertainty resamples over")
+    parser.add_argument("--joint-model", choices=JOINT_MODELS, default=JOINT_MODEL_DEFAULT, help=f"how GPU, CPU cores, RAM and OS coverage combine for target configurations with CPU, RAM or OS requirements, written to {COMPONENT_COVERAGE_FILE}")
+    parser.add_argument("--min-spec", type=float, metavar="COVERAGE", help=f"instead of analyzing target configurations, find the most demanding GPU that still covers this share of users (e.g. 0.85), and write the coverage curve to {MIN_SPEC_CURVE_FILE}")
+    parser.add_argument("--min-vram-gb", type=float, help="minimum VRAM for --min-spec")
+    parser.add_argument("--min-tflops", type=float, help="minimum SP TFLOPs for --min-spec")
+    parser.add_argument("--memory-types", nargs="+", help="allowed memory types for --min-spec")
+    args = parser.parse_args()
+
+    if args.console_rows < 0:
+        print("--console-rows must be 0 or more")
+        sys.exit(1)
+
+    # Fail before loading anything, rather than once the other outputs are written
+    if "parquet" in args.format and not is_parquet_available():
+        print("--format parquet requires pyarrow, which is not installed")
+        sys.exit(1)
+
+    loaded_sources = load_sources([("SteamDB", SteamDB), ("GPUBenchmarkDB", GPUBenchmarkDB), ("TargetConfigurationDB", TargetConfigurationDB), ("GPUArchitectureDB", GPUArchitectureDB)])
+
+    # Analysis can go ahead without architecture data, but not without the other sources
+    failed_sources = [name for (name, source) in loaded_sources.items() if source == None and name != "GPUArchitectureDB"]
+    if len(failed_sources) > 0:
+        print(f"Unable to analyze without {', '.join(failed_sources)}")
+        sys.exit(1)
+
+    steam_db = loaded_sources["SteamDB"]
+    gpu_db = loaded_sources.get("GPUArchitectureDB")
+    gpu_benchmark_db = loaded_sources["GPUBenchmarkDB"]
+    target_configuration_db = loaded_sources["TargetConfigurationDB"]
     print("All DBs up")
 
-    # The "Other" category is about 10%
-    # Remove it so it doesn't skew statistics when we calculate market share
-    steam_db.remove("Other")
-
-    cards = create_cards(steam_db, gpu_db, gpu_benchmark_db)
-    analyzed_cards = analyze(target_configuration_db, cards)
-
-    write_target_configurations_csv(target_configuration_db, cards, analyzed_cards)
-    write_all_cards_csv(target_configuration_db, cards, analyzed_cards)
+    with profile(args.profile):
+        if args.trend:
+            # Cards surveyed in any month are joined, so each month is analyzed against the same cards and the same rules
+            survey_trend = SurveyTrend(steam_db.survey_index)
+            steam_db.remove("Other")
+            steam_db.include(survey_trend.card_ids)
+            cards = create_cards(steam_db, gpu_db, gpu_benchmark_db)
+            with span("card_table"):
+                card_table = CardTable(cards)
+            target_configurations, coverage = analyze_trend(survey_trend, get_target_requirements(target_configuration_db, cards), card_table)
+            write_trend_csv(survey_trend, target_configurations, coverage)
+        else:
+            # The "Other" category is about 10%
+            # Remove it so it doesn't skew statistics when we calculate market share
+            steam_db.remove("Other")
+
+            cards = create_cards(steam_db, gpu_db, gpu_benchmark_db)
+            with span("card_index"):
+                card_index = CardIndex(cards)
+
+            if args.min_spec != None:
+                min_spec_solution = find_min_spec(card_index, args.min_spec,
+                    min_vram_bytes=int(args.min_vram_gb * 1024 * 1024 * 1024) if args.min_vram_gb != None else None,
+                    min_tflops=args.min_tflops,
+                    memory_types=args.memory_types)
+                write_min_spec_curve_csv(min_spec_solution, args.console_rows)
+                print(describe_min_spec(min_spec_solution))
+            else:
+                with span("card_table"):
+                    card_table = CardTable(cards)
+
+                analysis_cache = AnalysisCache(fingerprint_inputs(steam_db, gpu_db, gpu_benchmark_db))
+                analyzed_cards = analyze(target_configuration_db, cards, card_table, analysis_cache=None if args.full else analysis_cache)
+
+                if not args.full and analysis_cache.is_output_up_to_date(target_configuration_db, output_files(args.format)):
+                    print(f"Inputs unchanged, {', '.join(output_files(args.format))} are up to date")
+                else:
+                    write_outputs(target_configuration_db, cards, card_index, analyzed_cards, args.format, args.console_rows)
+                analysis_cache.write_cache(target_configuration_db, output_files(args.format))
+
+                # Coverage of the whole machine, for targets with requirements beyond the GPU
+                if any(target_configuration.has_component_requirements() for (target_configuration_name, target_configuration) in target_configuration_db.items()):
+                    component_coverage = analyze_component_coverage(steam_db, target_configuration_db, analyzed_cards, args.joint_model)
+                    write_component_coverage_csv(component_coverage, args.console_rows)
+
+                if args.uncertainty:
+                    coverage_uncertainty = analyze_coverage_uncertainty(card_table, analyzed_cards, steam_db.removed_popularity,
+                        resample_count=args.resamples, sample_size=args.sample_size, confidence=args.confidence, workers=args.workers)
+                    write_coverage_uncertainty_csv(coverage_uncertainty, args.console_rows)
+
+    INSTRUMENTATION.write_report()
@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tabulate import tabulate
+
+from analysis_cache import fingerprint
+from analyze import analyze, create_cards
+from cache_store import CacheStore
+from card_index import CardIndex
+from card_table import CardTable
+from component_coverage import analyze_component_coverage
+from gpu_architecture_db import GPUArchitectureDB, GPUArchitectureDBCache, GPUArchitectureDBEntry
+from gpu_benchmark_db import GPUBenchmarkDB, GPUBenchmarkDBCache, GPUBenchmarkDBEntry
+from output_writers import OUTPUT_FORMATS, is_parquet_available, write_outputs
+from steam_db import STEAM_DB_CPU_CORES_CATEGORY, STEAM_DB_OS_CATEGORY, STEAM_DB_SYSTEM_RAM_CATEGORY, SteamDB, SteamHWSurveyVideoCard
+from target_configuration_db import TargetConfiguration, TargetConfigurationDB
+
+BENCHMARK_BASELINE_FILE="benchmark_baseline.json"
+
+BENCHMARK_SEED=1
+BENCHMARK_STAGES=["create_cards", "card_index", "card_table", "analyze", "output", "component_coverage"]
+
+# Stages slower than the baseline by less than this are within timer noise, whatever the relative change
+BENCHMARK_MIN_REGRESSION_SECONDS=0.01
+
+# Share of the synthetic cards that appear in the Steam survey / in the GPU architecture DB
+BENCHMARK_SURVEY_FRACTION=0.5
+BENCHMARK_ARCHITECTURE_FRACTION=0.9
+
+BENCHMARK_VRAM_GB=[1, 2, 3, 4, 6, 8, 10, 12, 16, 20, 24, 32]
+BENCHMARK_MEMORY_TYPES=["DDR3", "GDDR5", "GDDR5X", "GDDR6", "GDDR6X", "GDDR7", "HBM2"]
+
+# Survey categories besides video cards, shaped like the real ones
+BENCHMARK_CATEGORIES={
+    STEAM_DB_CPU_CORES_CATEGORY: [("2 cpus", 0.02), ("4 cpus", 0.15), ("6 cpus", 0.35), ("8 cpus", 0.3), ("12 cpus", 0.1), ("16 cpus", 0.06), ("Other", 0.02)],
+    STEAM_DB_SYSTEM_RAM_CATEGORY: [("Less than 4 GB", 0.01), ("4 GB", 0.02), ("8 GB", 0.1), ("12 GB", 0.05), ("16 GB", 0.42), ("32 GB", 0.35), ("More than 64 GB", 0.04), ("Other", 0.01)],
+    STEAM_DB_OS_CATEGORY: [("Windows 11 64 bit", 0.6), ("Windows 10 64 bit", 0.35), ("Linux", 0.03), ("Other", 0.02)],
+}
+
+class SyntheticSources:
+    def __init__(self, card_count, target_count, seed=BENCHMARK_SEED):
+
+        # Real source classes filled with generated contents, bypassing their constructors so nothing touches the network
+        # Card names follow the Steam / PassMark naming so they go through the same name resolution as real cards
+        generator = random.Random(seed)
+
+        benchmark_entries = dict()
+        architecture_cache = GPUArchitectureDBCache()
+        steam_cards = dict()
+
+        for index in range(card_count):
+            card_id = f"NVIDIA GeForce SYN {index}" if index % 2 == 0 else f"AMD Radeon SYN {index}"
+            g3d_mark = int(generator.lognormvariate(8.5, 0.9))
+            benchmark_entry = GPUBenchmarkDBEntry(GPUBenchmarkDBEntry.id_to_name(card_id), g3d_mark, int(g3d_mark * generator.uniform(0.05, 0.2)))
+            benchmark_entries[card_id] = benchmark_entry
+
+            architecture_name = GPUArchitectureDB.id_to_name(card_id)
+            if generator.random() >= BENCHMARK_ARCHITECTURE_FRACTION:
+                architecture_cache.add_unknown(architecture_name)
+            else:
+                architecture_cache.add_card(architecture_name, GPUArchitectureDBEntry(name=architecture_name,
+                    compute_unit_count=generator.randint(4, 128),
+                    alu_count=generator.randint(256, 16384),
+                    single_precision_performance_tflops=round(g3d_mark / 1000.0 * generator.uniform(0.3, 0.6), 2),
+                    base_frequency_hz=generator.randint(800, 2000) * 1000000,
+                    turbo_frequency_hz=generator.randint(2000, 2800) * 1000000,
+                    memory_bus_width_bits=generator.choice([64, 128, 192, 256, 384]),
+                    memory_frequency_hz=generator.randint(1000, 2500) * 1000000.0,
+                    memory_size_bytes=generator.choice(BENCHMARK_VRAM_GB) * 1024 * 1024 * 1024,
+                    memory_type=generator.choice(BENCHMARK_MEMORY_TYPES),
+                    release_date=f"{generator.randint(2010, 2025)}-{generator.randint(1, 12):02d}-{generator.randint(1, 28):02d}",
+                    vendor="NVIDIA" if index % 2 == 0 else "AMD",
+                    asic_name=f"SYN{index % 97}"))
+
+            if generator.random() < BENCHMARK_SURVEY_FRACTION:
+                steam_cards[card_id] = SteamHWSurveyVideoCard(name=card_id, popularity=generator.paretovariate(1.2))
+
+        # Popularity sums to 90%, with the other 10% in the "Other" entry like the real survey
+        total_popularity = sum(steam_card.popularity for steam_card in steam_cards.values())
+        for steam_card in steam_cards.values():
+            steam_card.popularity = steam_card.popularity / total_popularity * 0.9
+        steam_cards["Other"] = SteamHWSurveyVideoCard(name="Other", popularity=0.1)
+
+        self.steam_db = SteamDB.__new__(SteamDB)
+        self.steam_db.date = "synthetic"
+        self.steam_db.cards = steam_cards
+        self.steam_db.removed_popularity = 0.0
+        self.steam_db.categories = BENCHMARK_CATEGORIES
+
+        self.gpu_benchmark_db = GPUBenchmarkDB.__new__(GPUBenchmarkDB)
+        self.gpu_benchmark_db.cache = GPUBenchmarkDBCache(benchmark_entries)
+
+        # Unknown cards are cached as such, so that the architecture DB never tries to fetch them
+        architecture_cache.take_changes()
+        self.gpu_db = GPUArchitectureDB.__new__(GPUArchitectureDB)
+        self.gpu_db.cache = architecture_cache
+        self.gpu_db.prefetched_names = set()
+
+        # Targets are surveyed cards; half of them have requirements beyond G3D mark
+        target_gpu_names = [card_id for card_id in steam_cards.keys() if card_id != "Other"]
+        configs = dict()
+        for index in range(target_count):
+            name = f"Target {index}"
+            gpu_name = generator.choice(target_gpu_names)
+            if index % 2 == 0:
+                configs[name] = TargetConfiguration(name, gpu_name)
+            else:
+                configs[name] = TargetConfiguration(name, gpu_name,
+                    min_vram_bytes=generator.choice(BENCHMARK_VRAM_GB[:6]) * 1024 * 1024 * 1024,
+                    min_tflops=generator.choice([None, 1.0, 2.5, 5.0]),
+                    memory_types=generator.choice([None, BENCHMARK_MEMORY_TYPES[1:4], BENCHMARK_MEMORY_TYPES[3:]]))
+
+        # A third of the targets also have CPU, RAM or OS requirements; drawn from their own generator, so the GPU side stays the same
+        component_generator = random.Random(seed + 1)
+        for index, target_configuration in enumerate(configs.values()):
+            if index % 3 == 0:
+                target_configuration.min_cpu_cores = component_generator.choice([None, 4, 6, 8])
+                target_configuration.min_ram_gb = component_generator.choice([None, 8, 16, 32])
+                target_configuration.operating_systems = component_generator.choice([None, ["Windows"], ["Windows 11", "Linux"]])
+
+        self.target_configuration_db = TargetConfigurationDB.__new__(TargetConfigurationDB)
+        self.target_configuration_db.configs = configs
+
+    def open_stores(self):
+        self.gpu_db.store = CacheStore(os.path.join("cache", "benchmark_gpu_architecture_db.sqlite"))
+        self.gpu_benchmark_db.store = CacheStore(os.path.join("cache", "benchmark_gpu_benchmark_db.sqlite"))
+
+def run_pipeline(sources, output_formats, trace_memory):
+
+    # One pass over the analysis pipeline, the same way analyze.py runs it
+    # Returns stage -> seconds, stage -> peak traced bytes (if tracing), and a fingerprint of the analysis results
+    timings = dict()
+    peak_memory = dict()
+
+    @contextlib.contextmanager
+    def stage(name):
+        if trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_time = time.perf_counter()
+        yield
+        timings[name] = time.perf_counter() - start_time
+        if trace_memory:
+            peak_memory[name] = tracemalloc.get_traced_memory()[1] - start_memory
+
+    steam_db = SteamDB.__new__(SteamDB)
+    steam_db.date = sources.steam_db.date
+    steam_db.removed_popularity = 0.0
+    steam_db.categories = sources.steam_db.categories
+    steam_db.cards = {card_id: SteamHWSurveyVideoCard(name=card.name, popularity=card.popularity) for (card_id, card) in sources.steam_db.cards.items()}
+    steam_db.remove("Other")
+
+    with open(os.devnull, 'wt') as devnull, contextlib.redirect_stdout(devnull):
+        with stage("create_cards"):
+            cards = create_cards(steam_db, sources.gpu_db, sources.gpu_benchmark_db)
+        with stage("card_index"):
+            card_index = CardIndex(cards)
+        with stage("card_table"):
+            card_table = CardTable(cards)
+        with stage("analyze"):
+            analyzed_cards = analyze(sources.target_configuration_db, cards, card_table)
+        with stage("output"):
+            write_outputs(sources.target_configuration_db, cards, card_index, analyzed_cards, output_formats, 0)
+        with stage("component_coverage"):
+            analyze_component_coverage(steam_db, sources.target_configuration_db, analyzed_cards)
+
+    results_fingerprint = fingerprint(sorted((name, round(analyzed_card.market_share, 9), len(analyzed_card.eligible_cards())) for (name, analyzed_card) in analyzed_cards.items()))
+    return timings, peak_memory, results_fingerprint
+
+def run_benchmark(card_count, target_count, output_formats, repeat):
+
+    print(f"Benchmarking {card_count} cards x {target_count} targets")
+    start_time = time.perf_counter()
+    sources = SyntheticSources(card_count, target_count)
+    print(f"Generated synthetic sources in {time.perf_counter() - start_time:.2f}s")
+
+    # Every run starts from empty caches in a scratch directory, so name resolutions and outputs are never reused
+    # Timings are the best of several untraced runs; peak memory comes from one extra run under tracemalloc, which is much slower
+    best_timings = dict()
+    results_fingerprint = None
+    working_directory = os.getcwd()
+    for run_index in range(repeat + 1):
+        trace_memory = run_index == repeat
+        with tempfile.TemporaryDirectory() as scratch_directory:
+            os.chdir(scratch_directory)
+            os.mkdir("cache")
+            os.mkdir("output")
+            try:
+                sources.open_stores()
+                if trace_memory:
+                    tracemalloc.start()
+                timings, peak_memory, results_fingerprint = run_pipeline(sources, output_formats, trace_memory)
+            finally:
+                if trace_memory:
+                    tracemalloc.stop()
+                os.chdir(working_directory)
+
+        if not trace_memory:
+            for stage, seconds in timings.items():
+                best_timings[stage] = min(best_timings.get(stage, seconds), seconds)
+
+    return {"timings": best_timings, "peak_memory": peak_memory, "results_fingerprint": results_fingerprint}
+
+def benchmark_key(card_count, target_count, output_formats):
+    return f"{card_count} cards x {target_count} targets, {'+'.join(output_formats)}"
+
+def read_baseline():
+    if not os.path.exists(BENCHMARK_BASELINE_FILE):
+        return dict()
+    with open(BENCHMARK_BASELINE_FILE, 'rt') as baseline_file:
+        return json.load(baseline_file)
+
+def write_baseline(baseline):
+    with open(BENCHMARK_BASELINE_FILE, 'wt') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    print(f"Baseline written to {BENCHMARK_BASELINE_FILE}")
+
+def compare(key, result, baseline_result, tolerance):
+
+    # Returns the table rows for one benchmark, and whether any stage regressed beyond the tolerance
+    rows = []
+    regressed = False
+    for stage in BENCHMARK_STAGES:
+        seconds = result["timings"][stage]
+        peak_megabytes = result["peak_memory"][stage] / (1024 * 1024)
+        baseline_seconds = baseline_result["timings"].get(stage) if baseline_result != None else None
+        change = None
+        if baseline_seconds != None and baseline_seconds > 0:
+            change = seconds / baseline_seconds - 1.0
+            if change > tolerance and seconds - baseline_seconds > BENCHMARK_MIN_REGRESSION_SECONDS:
+                regressed = True
+        rows.append([key, stage, f"{seconds:.3f}", f"{peak_megabytes:.1f}",
+            f"{baseline_seconds:.3f}" if baseline_seconds != None else None,
+            f"{change * 100:+.1f}%" if change != None else None])
+
+    if baseline_result != None and baseline_result["results_fingerprint"] != result["results_fingerprint"]:
+        print(f"{key}: analysis results differ from the baseline")
+        regressed = True
+
+    return rows, regressed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time each stage of the analysis pipeline, and its peak memory, on synthetic data of configurable size")
+    parser.add_argument("--cards", type=int, nargs="+", default=[10000], help="numbers of synthetic cards to benchmark with")
+    parser.add_argument("--targets", type=int, nargs="+", default=[100], help="numbers of synthetic target configurations to benchmark with")
+    parser.add_argument("--format", nargs="+", choices=OUTPUT_FORMATS, default=["csv"], help="formats for the all-cards table")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs per size; the fastest one is reported")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown relative to the baseline beyond which a stage counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store these results in {BENCHMARK_BASELINE_FILE} instead of comparing against it")
+    args = parser.parse_args()
+
+    # Timings only come from the untraced runs, so there has to be at least one
+    if args.repeat < 1:
+        print("--repeat must be 1 or more")
+        sys.exit(1)
+
+    if "parquet" in args.format and not is_parquet_available():
+        print("--format parquet requires pyarrow, which is not installed")
+        sys.exit(1)
+
+    baseline = read_baseline()
+    rows = []
+    regressed = False
+    for card_count in args.cards:
+        for target_count in args.targets:
+            key = benchmark_key(card_count, target_count, args.format)
+            result = run_benchmark(card_count, target_count, args.format, args.repeat)
+            baseline_result = baseline.get(key) if not args.save_baseline else None
+            key_rows, key_regressed = compare(key, result, baseline_result, args.tolerance)
+            rows += key_rows
+            regressed = regressed or key_regressed
+            baseline[key] = result
+
+    print(tabulate(rows, headers=["Benchmark", "Stage", "Seconds", "Peak MB", "Baseline seconds", "Change"], tablefmt='fancy_grid'))
+
+    if args.save_baseline:
+        write_baseline(baseline)
+    elif regressed:
+        print(f"Regressions beyond {args.tolerance * 100:.0f}% of {BENCHMARK_BASELINE_FILE}")
+        sys.exit(1)
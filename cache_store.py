@@ -0,0 +1,136 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+# Bumped whenever the pickled form of cached records changes, so that stores written in an older form get rewritten once
+CACHE_RECORD_FORMAT="2"
+
+class CacheStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+        # Each write is a single SQLite transaction, so an interrupted run leaves either the old or the new entries behind,
+        #   never a truncated file. WAL mode lets other processes keep reading while a write is in progress.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, fetched_at REAL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+            # Stores written before entries had fetch times start their clock now, rather than all expiring at once
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(entries)").fetchall()]
+            if not "fetched_at" in columns:
+                self.connection.execute("ALTER TABLE entries ADD COLUMN fetched_at REAL")
+                self.connection.execute("UPDATE entries SET fetched_at = ?", (time.time(),))
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row == None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def items(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT key, value FROM entries ORDER BY rowid").fetchall()
+        return [(key, pickle.loads(value)) for (key, value) in rows]
+
+    def versioned_items(self):
+
+        # The entries with their fetch times, together with the version they belong to, read in a single transaction
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                rows = self.connection.execute("SELECT key, value, fetched_at FROM entries ORDER BY rowid").fetchall()
+            finally:
+                self.connection.execute("COMMIT")
+        return (row[0] if row != None else ""), [(key, pickle.loads(value), fetched_at) for (key, value, fetched_at) in rows]
+
+    def fetched_before(self, cutoff_time):
+
+        # Entries last written before cutoff_time, as (key, value, fetch time)
+        with self.lock:
+            rows = self.connection.execute("SELECT key, value, fetched_at FROM entries WHERE fetched_at < ? ORDER BY rowid", (cutoff_time,)).fetchall()
+        return [(key, pickle.loads(value), fetched_at) for (key, value, fetched_at) in rows]
+
+    def last_fetch_time(self):
+        with self.lock:
+            row = self.connection.execute("SELECT MAX(fetched_at) FROM entries").fetchone()
+        return row[0]
+
+    def put_many(self, entries):
+        if len(entries) == 0:
+            return
+        fetched_at = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO entries (key, value, fetched_at) VALUES (?, ?, ?)", [(key, pickle.dumps(value), fetched_at) for (key, value) in entries.items()])
+            self.bump_version()
+
+    def replace_all(self, entries):
+        fetched_at = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.executemany("INSERT INTO entries (key, value, fetched_at) VALUES (?, ?, ?)", [(key, pickle.dumps(value), fetched_at) for (key, value) in entries.items()])
+            self.bump_version()
+
+    def bump_version(self):
+
+        # A random token rather than a counter, so that a deleted and rebuilt store never repeats an earlier version
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (uuid.uuid4().hex,))
+
+    def version(self):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row != None else ""
+
+    def meta(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row != None else None
+
+    def is_record_format_current(self):
+        return self.meta("record_format") == CACHE_RECORD_FORMAT
+
+    def set_record_format_current(self):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('record_format', ?)", (CACHE_RECORD_FORMAT,))
+
+    def rewrite_records(self, entries):
+
+        # Same entries in a new form, so they keep the time they were fetched
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE entries SET value = ? WHERE key = ?", [(pickle.dumps(value), key) for (key, value) in entries.items()])
+            self.bump_version()
+        self.set_record_format_current()
+        print(f"Rewritten {self.path} in the current record format, {len(entries)} entries")
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def read_legacy_pickle(path):
+
+    # Caches used to be a single pickled object per file; these are imported into the store on first use
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as legacy_file:
+            return pickle.load(legacy_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"Unable to read legacy cache {path}: {e}")
+        return None
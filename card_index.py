@@ -0,0 +1,145 @@
+import bisect
+import numpy
+
+class CardRequirements:
+    def __init__(self, min_g3d_mark=None, min_vram_bytes=None, min_tflops=None, memory_types=None):
+        self.min_g3d_mark = min_g3d_mark
+        self.min_vram_bytes = min_vram_bytes
+        self.min_tflops = min_tflops
+        self.memory_types = memory_types
+
+    def matches(self, card):
+        if card.gpu_benchmark_db_entry == None:
+            return False
+        if self.min_g3d_mark != None and card.gpu_benchmark_db_entry.g3d_mark < self.min_g3d_mark:
+            return False
+        if self.is_g3d_mark_only():
+            return True
+
+        gpu_architecture_db_card = card.gpu_architecture_db_card
+        if gpu_architecture_db_card == None:
+            return False
+        if self.min_vram_bytes != None and gpu_architecture_db_card.memory_size_bytes < self.min_vram_bytes:
+            return False
+        if self.min_tflops != None and gpu_architecture_db_card.single_precision_performance_tflops < self.min_tflops:
+            return False
+        if self.memory_types != None and not gpu_architecture_db_card.memory_type in self.memory_types:
+            return False
+        return True
+
+    def is_g3d_mark_only(self):
+        return self.min_vram_bytes == None and self.min_tflops == None and self.memory_types == None
+
+class AttributeIndex:
+    def __init__(self, values):
+
+        # values[position] is the attribute value for the card at that position in the CardIndex, or None if unknown
+        # sorted_positions lists the positions with a known value, by ascending value
+        self.values = values
+        self.sorted_positions = numpy.array(sorted((position for (position, value) in enumerate(values) if value != None), key=lambda position: values[position]), dtype=numpy.int64)
+        self.sorted_values = numpy.array([values[position] for position in self.sorted_positions], dtype=numpy.float64)
+
+    def first_position_at_least(self, value):
+        return int(numpy.searchsorted(self.sorted_values, value, side="left"))
+
+    def positions_at_least(self, value):
+        return self.sorted_positions[self.first_position_at_least(value):]
+
+    def mask_at_least(self, value):
+
+        # True at the positions whose value is known and at least value
+        mask = numpy.zeros(len(self.values), dtype=bool)
+        mask[self.positions_at_least(value)] = True
+        return mask
+
+class CardIndex:
+    def __init__(self, cards):
+
+        # Cards with benchmark data, sorted by ascending G3D mark
+        # cumulative_popularity[i] is the total Steam popularity of sorted_cards[:i]
+        self.sorted_cards = sorted((card for card in cards.values() if card.gpu_benchmark_db_entry != None), key=lambda card: card.gpu_benchmark_db_entry.g3d_mark)
+        self.g3d_marks = [card.gpu_benchmark_db_entry.g3d_mark for card in self.sorted_cards]
+
+        self.popularity = numpy.array([card.steam_card.popularity if card.steam_card != None else 0.0 for card in self.sorted_cards], dtype=numpy.float64)
+        self.cumulative_popularity = [0.0]
+        total_popularity = 0.0
+        for popularity in self.popularity.tolist():
+            total_popularity += popularity
+            self.cumulative_popularity.append(total_popularity)
+
+        # Secondary indexes over the same positions, for requirements beyond G3D mark
+        # Memory types are coded like in CardTable, with -1 for cards without one
+        self.vram_bytes_index = AttributeIndex([card.gpu_architecture_db_card.memory_size_bytes if card.gpu_architecture_db_card != None else None for card in self.sorted_cards])
+        self.tflops_index = AttributeIndex([card.gpu_architecture_db_card.single_precision_performance_tflops if card.gpu_architecture_db_card != None else None for card in self.sorted_cards])
+        memory_types = [card.gpu_architecture_db_card.memory_type if card.gpu_architecture_db_card != None else None for card in self.sorted_cards]
+        self.memory_type_codes = {memory_type: code for (code, memory_type) in enumerate(sorted(set(memory_type for memory_type in memory_types if memory_type != None)))}
+        self.memory_type = numpy.array([self.memory_type_codes.get(memory_type, -1) for memory_type in memory_types], dtype=numpy.int32)
+
+    def first_eligible_position(self, g3d_mark):
+        return bisect.bisect_left(self.g3d_marks, g3d_mark)
+
+    def eligible_cards(self, g3d_mark):
+        return self.sorted_cards[self.first_eligible_position(g3d_mark):]
+
+    def market_share(self, g3d_mark):
+        return self.cumulative_popularity[-1] - self.cumulative_popularity[self.first_eligible_position(g3d_mark)]
+
+    def descending_cards(self):
+
+        # Cards by descending G3D mark; cards with equal G3D marks keep the order they were indexed in
+        end = len(self.sorted_cards)
+        while end > 0:
+            start = self.first_eligible_position(self.g3d_marks[end - 1])
+            yield from self.sorted_cards[start:end]
+            end = start
+
+    def query_mask(self, requirements):
+
+        # One boolean mask over the index positions per requirement, intersected:
+        #   a suffix of the positions for G3D mark, and a suffix of the attribute's sorted positions for VRAM and TFLOPs
+        mask = numpy.ones(len(self.sorted_cards), dtype=bool)
+        if requirements.min_g3d_mark != None:
+            mask[:self.first_eligible_position(requirements.min_g3d_mark)] = False
+        if requirements.min_vram_bytes != None:
+            mask &= self.vram_bytes_index.mask_at_least(requirements.min_vram_bytes)
+        if requirements.min_tflops != None:
+            mask &= self.tflops_index.mask_at_least(requirements.min_tflops)
+        if requirements.memory_types != None:
+            mask &= numpy.isin(self.memory_type, [self.memory_type_codes[memory_type] for memory_type in requirements.memory_types if memory_type in self.memory_type_codes])
+        return mask
+
+    def query_positions(self, requirements):
+
+        # Positions of the cards meeting the requirements, in ascending G3D mark order
+        return numpy.flatnonzero(self.query_mask(requirements)).tolist()
+
+    def query(self, requirements):
+        if requirements.is_g3d_mark_only() and requirements.min_g3d_mark != None:
+            return self.eligible_cards(requirements.min_g3d_mark)
+        return [self.sorted_cards[position] for position in self.query_positions(requirements)]
+
+    def query_market_share(self, requirements):
+        if requirements.is_g3d_mark_only() and requirements.min_g3d_mark != None:
+            return self.market_share(requirements.min_g3d_mark)
+        return float(self.popularity[self.query_mask(requirements)].sum())
+
+    def coverage_curve(self, requirements):
+
+        # (card, market share with that card's G3D mark as the minimum) for every card meeting the requirements, by descending G3D mark
+        # Built in one pass over the index, accumulating popularity from the strongest card down; cards with equal G3D marks share one share
+        positions = self.query_positions(requirements)
+        curve = []
+        market_share = 0.0
+        end = len(positions)
+        while end > 0:
+            g3d_mark = self.g3d_marks[positions[end - 1]]
+            start = end
+            while start > 0 and self.g3d_marks[positions[start - 1]] == g3d_mark:
+                start -= 1
+                market_share += self.popularity[positions[start]]
+            curve += [(self.sorted_cards[position], market_share) for position in positions[start:end]]
+            end = start
+        return curve
+
+    def __len__(self):
+        return len(self.sorted_cards)
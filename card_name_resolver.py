@@ -0,0 +1,161 @@
+import hashlib
+import re
+
+from cache_store import CacheStore
+
+CARD_NAME_RESOLVER_CACHE_FILE="cache/card_name_resolver.sqlite"
+
+CARD_NAME_RESOLVER_FUZZY_MIN_SCORE=0.75
+
+# Tokens that vary between sources without identifying a different card
+CARD_NAME_IGNORED_TOKENS={"nvidia", "amd", "ati", "graphics", "tm", "r"}
+
+# Tokens that distinguish otherwise identically numbered models, and so must match exactly, like model numbers
+CARD_NAME_VARIANT_TOKENS={"ti", "super", "xt", "xtx", "gre", "le", "se", "ultra", "laptop", "mobile", "max", "q"}
+
+# Steam / PassMark card id -> GPU architecture DB name, where the architecture DB doesn't follow the usual naming
+ARCHITECTURE_NAME_ALIASES={
+    'NVIDIA GeForce RTX 2060': 'RTX 2060 (Founders Edition)', # This should have been mapped to Reference, but there is no such in the DB. Founders Edition is close though
+    'NVIDIA GeForce RTX 2070': 'RTX 2070 (Reference)',
+    'NVIDIA GeForce RTX 2080': 'RTX 2080 (Reference)',
+    'NVIDIA GeForce RTX 2080 Ti': 'RTX 2080 Ti (Reference)',
+}
+
+ARCHITECTURE_ID_ALIASES={name: card_id for (card_id, name) in ARCHITECTURE_NAME_ALIASES.items()}
+
+def architecture_name_from_id(card_id):
+    alias = ARCHITECTURE_NAME_ALIASES.get(card_id)
+    if alias != None:
+        return alias
+    return card_id.removeprefix('AMD Radeon ').removeprefix('NVIDIA GeForce ').replace('SUPER', 'Super')
+
+def architecture_id_from_name(name):
+    alias = ARCHITECTURE_ID_ALIASES.get(name)
+    if alias != None:
+        return alias
+    # Architecture DB names already start with the RX / GTX / RTX series, so only the vendor prefix is added
+    elif name.startswith('RX '):
+        return f"AMD Radeon {name}"
+    elif name.startswith('GTX ') or name.startswith('RTX '):
+        return f"NVIDIA GeForce {name}".replace("Super", "SUPER")
+    else:
+        return name
+
+def benchmark_name_from_id(card_id):
+    return card_id.replace('NVIDIA GeForce ', 'GeForce ').replace('AMD Radeon ', 'Radeon ').replace('Intel HD Graphics ', 'Intel HD ')
+
+def benchmark_id_from_name(name):
+    if name.startswith('GeForce '):
+        return f"NVIDIA {name}"
+    if name.startswith('Radeon '):
+        return f"AMD {name}"
+    if name.startswith('Intel HD ') and not name.startswith('Intel HD Graphics '):
+        return name.replace('Intel HD ', 'Intel HD Graphics ')
+    return name
+
+def card_name_tokens(name):
+    return tuple(token for token in re.split(r"[^a-z0-9]+", name.lower()) if token != "" and not token in CARD_NAME_IGNORED_TOKENS)
+
+def is_model_token(token):
+    return token in CARD_NAME_VARIANT_TOKENS or any(character.isdigit() for character in token)
+
+class CardNameResolver:
+    def __init__(self, benchmark_card_ids, architecture_card_names):
+
+        self.benchmark_card_ids = list(benchmark_card_ids)
+        self.benchmark_card_id_set = set(self.benchmark_card_ids)
+        self.architecture_card_names = set(architecture_card_names)
+
+        # Memoized PassMark ids are only valid for the set of PassMark ids they were resolved against
+        # Architecture names aren't memoized: they depend on the architecture DB, which grows as cards get fetched, and are cheap to resolve again
+        self.store = CacheStore(CARD_NAME_RESOLVER_CACHE_FILE)
+        fingerprint = hashlib.sha256("\n".join(["benchmark_card_ids"] + sorted(self.benchmark_card_ids)).encode()).hexdigest()
+        found, stored_fingerprint = self.store.get("fingerprint")
+        if not found or stored_fingerprint != fingerprint:
+            self.store.replace_all({"fingerprint": fingerprint})
+        self.resolutions = dict((key, value) for (key, value) in self.store.items() if key != "fingerprint")
+        self.new_resolutions = dict()
+
+        self.indexed = False
+        self.architecture_names_by_tokens = None
+
+    def build_index(self):
+
+        # Normalized token tuple -> PassMark card id, for exact and alias hits
+        # Names whose normalized form collides are left out, as there is no way of telling them apart
+        self.benchmark_ids_by_tokens = dict()
+        ambiguous_tokens = set()
+        for benchmark_card_id in self.benchmark_card_ids:
+            tokens = card_name_tokens(benchmark_card_id)
+            if tokens in self.benchmark_ids_by_tokens and self.benchmark_ids_by_tokens[tokens] != benchmark_card_id:
+                ambiguous_tokens.add(tokens)
+            self.benchmark_ids_by_tokens.setdefault(tokens, benchmark_card_id)
+        for tokens in ambiguous_tokens:
+            del self.benchmark_ids_by_tokens[tokens]
+
+        # Model tokens -> [(PassMark card id, its token set)], for fuzzy matching
+        # A fuzzy match needs exactly the same model tokens, so only the PassMark names in that one group are scored
+        self.benchmark_ids_by_model_tokens = dict()
+        for benchmark_card_id in self.benchmark_card_ids:
+            token_set = frozenset(card_name_tokens(benchmark_card_id))
+            model_tokens = frozenset(token for token in token_set if is_model_token(token))
+            self.benchmark_ids_by_model_tokens.setdefault(model_tokens, []).append((benchmark_card_id, token_set))
+
+        self.indexed = True
+
+    def resolve(self, card_id):
+
+        # Returns (PassMark card id or None, GPU architecture DB name)
+        if card_id in self.resolutions:
+            benchmark_card_id = self.resolutions[card_id]
+        else:
+            if not self.indexed:
+                self.build_index()
+            benchmark_card_id = self.resolve_benchmark_card_id(card_id)
+            self.resolutions[card_id] = benchmark_card_id
+            self.new_resolutions[card_id] = benchmark_card_id
+        return benchmark_card_id, self.resolve_architecture_name(benchmark_card_id if benchmark_card_id != None else card_id)
+
+    def resolve_benchmark_card_id(self, card_id):
+        if card_id in self.benchmark_card_id_set:
+            return card_id
+
+        tokens = card_name_tokens(card_id)
+        benchmark_card_id = self.benchmark_ids_by_tokens.get(tokens)
+        if benchmark_card_id != None:
+            return benchmark_card_id
+
+        return self.fuzzy_match_benchmark_card_id(tokens)
+
+    def fuzzy_match_benchmark_card_id(self, tokens):
+
+        # Token-set similarity against the PassMark names with the same model tokens that share at least one token
+        # Model numbers and variants must match exactly, so e.g. an RTX 3060 never resolves to an RTX 3060 Ti
+        token_set = frozenset(tokens)
+        model_tokens = frozenset(token for token in token_set if is_model_token(token))
+
+        # Best score wins; ties go to the shortest name, then alphabetical order
+        candidates = []
+        for benchmark_card_id, candidate_token_set in self.benchmark_ids_by_model_tokens.get(model_tokens, []):
+            shared_token_count = len(token_set & candidate_token_set)
+            if shared_token_count == 0:
+                continue
+            score = shared_token_count / len(token_set | candidate_token_set)
+            if score >= CARD_NAME_RESOLVER_FUZZY_MIN_SCORE:
+                candidates.append((-score, len(benchmark_card_id), benchmark_card_id))
+
+        if len(candidates) == 0:
+            return None
+        return min(candidates)[2]
+
+    def resolve_architecture_name(self, card_id):
+        architecture_name = architecture_name_from_id(card_id)
+        if architecture_name in self.architecture_card_names:
+            return architecture_name
+        if self.architecture_names_by_tokens == None:
+            self.architecture_names_by_tokens = {card_name_tokens(architecture_id_from_name(name)): name for name in self.architecture_card_names}
+        return self.architecture_names_by_tokens.get(card_name_tokens(card_id), architecture_name)
+
+    def write_cache(self):
+        self.store.put_many(self.new_resolutions)
+        self.new_resolutions = dict()
@@ -0,0 +1,76 @@
+import numpy
+
+# Targets are evaluated a chunk at a time, with about this many (target, card) cells per chunk,
+#   so eligibility masks and the float arrays summed from them stay bounded however many targets and cards there are
+CARD_TABLE_CHUNK_CELLS=4*1024*1024
+
+class CardTable:
+    def __init__(self, cards):
+
+        # Columnar view of the joined cards, one entry per card in the same order as card_ids
+        # Missing values are NaN (NaT for dates), and popularity is 0 for cards that are not in the Steam survey
+        self.card_ids = list(cards.keys())
+        self.cards = list(cards.values())
+        self.positions = {card_id: position for (position, card_id) in enumerate(self.card_ids)}
+
+        self.g3d_mark = numpy.array([card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else numpy.nan for card in self.cards], dtype=numpy.float64)
+        self.g2d_mark = numpy.array([card.gpu_benchmark_db_entry.g2d_mark if card.gpu_benchmark_db_entry != None else numpy.nan for card in self.cards], dtype=numpy.float64)
+        self.popularity = numpy.array([card.steam_card.popularity if card.steam_card != None else 0.0 for card in self.cards], dtype=numpy.float64)
+        self.tflops = numpy.array([card.gpu_architecture_db_card.single_precision_performance_tflops if card.gpu_architecture_db_card != None else numpy.nan for card in self.cards], dtype=numpy.float64)
+        self.vram_bytes = numpy.array([card.gpu_architecture_db_card.memory_size_bytes if card.gpu_architecture_db_card != None else numpy.nan for card in self.cards], dtype=numpy.float64)
+        memory_types = [card.gpu_architecture_db_card.memory_type if card.gpu_architecture_db_card != None else None for card in self.cards]
+        self.memory_type_codes = {memory_type: code for (code, memory_type) in enumerate(sorted(set(memory_type for memory_type in memory_types if memory_type != None)))}
+        self.memory_type = numpy.array([self.memory_type_codes.get(memory_type, -1) for memory_type in memory_types], dtype=numpy.int32)
+        self.release_date = numpy.array([CardTable.parse_release_date(card.gpu_architecture_db_card.release_date) if card.gpu_architecture_db_card != None else numpy.datetime64("NaT") for card in self.cards], dtype="datetime64[D]")
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    def eligibility(self, requirements_list):
+        return eligibility(self.g3d_mark, self.vram_bytes, self.tflops, self.memory_type, *self.thresholds(requirements_list))
+
+    def thresholds(self, requirements_list):
+
+        # Requirements as arrays with one entry per target, NaN where a target has no such requirement,
+        #   plus a targets x (memory type codes + 1) mask of allowed memory types
+        # Cards without a memory type have code -1, i.e. the last column, which only targets without a memory type requirement allow
+        thresholds = tuple(numpy.array([getattr(requirements, name) if getattr(requirements, name) != None else numpy.nan for requirements in requirements_list], dtype=numpy.float64)
+            for name in ("min_g3d_mark", "min_vram_bytes", "min_tflops"))
+        allowed_memory_types = numpy.ones((len(requirements_list), len(self.memory_type_codes) + 1), dtype=bool)
+        for (target_position, requirements) in enumerate(requirements_list):
+            if requirements.memory_types != None:
+                allowed_memory_types[target_position] = False
+                for memory_type in requirements.memory_types:
+                    if memory_type in self.memory_type_codes:
+                        allowed_memory_types[target_position, self.memory_type_codes[memory_type]] = True
+        return thresholds + (allowed_memory_types,)
+
+    def market_shares(self, requirements_list):
+        market_shares = numpy.zeros(len(requirements_list))
+        for chunk in target_chunks(len(requirements_list), len(self)):
+            market_shares[chunk] = numpy.where(self.eligibility(requirements_list[chunk]), self.popularity, 0.0).sum(axis=1)
+        return market_shares
+
+    @staticmethod
+    def parse_release_date(release_date):
+        try:
+            return numpy.datetime64(release_date, "D")
+        except (TypeError, ValueError):
+            return numpy.datetime64("NaT")
+
+def target_chunks(target_count, card_count):
+
+    # Slices of consecutive target positions, CARD_TABLE_CHUNK_CELLS cells at most per slice unless a single target needs more
+    chunk_size = max(1, CARD_TABLE_CHUNK_CELLS // max(1, card_count))
+    return [slice(start, min(start + chunk_size, target_count)) for start in range(0, target_count, chunk_size)]
+
+def eligibility(g3d_mark, vram_bytes, tflops, memory_type, min_g3d_marks, min_vram_bytes, min_tflops, allowed_memory_types):
+
+    # targets x cards, from card columns and per-target thresholds as laid out by CardTable.thresholds()
+    # A NaN threshold means "no requirement", while a NaN card value never meets a requirement
+    eligible = ~numpy.isnan(g3d_mark)[numpy.newaxis, :].repeat(len(min_g3d_marks), axis=0)
+    for (column, thresholds) in ((g3d_mark, min_g3d_marks), (vram_bytes, min_vram_bytes), (tflops, min_tflops)):
+        if not numpy.isnan(thresholds).all():
+            eligible &= (column[numpy.newaxis, :] >= thresholds[:, numpy.newaxis]) | numpy.isnan(thresholds)[:, numpy.newaxis]
+    eligible &= allowed_memory_types[:, memory_type]
+    return eligible
@@ -0,0 +1,139 @@
+import csv
+import math
+import numpy
+import re
+from tabulate import tabulate
+
+from instrumentation import timed
+from steam_db import STEAM_DB_CPU_CORES_CATEGORY, STEAM_DB_OS_CATEGORY, STEAM_DB_SYSTEM_RAM_CATEGORY
+
+COMPONENT_COVERAGE_FILE="output/component_coverage.csv"
+
+# How per-category coverages combine into the share of users meeting all requirements at once
+#   independent: categories are independent, coverages multiply
+#   min: categories are perfectly correlated (users with a better GPU also have more cores, RAM...), the smallest coverage wins; an upper bound
+#   lower_bound: no assumption at all, the Fréchet lower bound max(0, sum of coverages - (categories - 1))
+JOINT_MODELS=["independent", "min", "lower_bound"]
+JOINT_MODEL_DEFAULT="independent"
+
+SURVEY_QUANTITY_PATTERN=re.compile(r"(\d+(?:\.\d+)?)\s*(MB|GB|TB)?", re.IGNORECASE)
+SURVEY_QUANTITY_GB_FACTORS={"mb": 1.0 / 1024.0, "gb": 1.0, "tb": 1024.0}
+
+def parse_survey_quantity(name):
+
+    # "4 cpus", "16 GB", "512 MB", "More than 64 GB" -> 4, 16, 0.5, 64; sizes are in GB
+    # "Less than 4 GB" is just under 4, so it never meets a minimum of 4; names without a number are None
+    match = SURVEY_QUANTITY_PATTERN.search(name)
+    if match == None:
+        return None
+    value = float(match.group(1)) * SURVEY_QUANTITY_GB_FACTORS.get((match.group(2) or "gb").lower())
+    if name.lower().startswith("less than"):
+        value = math.nextafter(value, 0.0)
+    return value
+
+def survey_shares(rows):
+
+    # Survey rows without "Other", rescaled to add up to 1 the same way SteamDB.remove() does for video cards
+    rows = [(name, popularity) for (name, popularity) in rows if name != "Other"]
+    total_popularity = sum(popularity for (name, popularity) in rows)
+    return [(name, popularity / total_popularity if total_popularity > 0.0 else 0.0) for (name, popularity) in rows]
+
+class QuantityMarginal:
+    def __init__(self, rows):
+
+        # Lookup table for "at least" requirements: distinct values ascending, and the share of users with at least each of them
+        # Any number of thresholds is then looked up at once with a single searchsorted
+        values = dict()
+        for name, share in survey_shares(rows):
+            value = parse_survey_quantity(name)
+            if value != None:
+                values[value] = values.get(value, 0.0) + share
+        self.values = numpy.array(sorted(values.keys()), dtype=numpy.float64)
+        shares = numpy.array([values[value] for value in self.values], dtype=numpy.float64)
+        self.shares_at_least = numpy.append(numpy.cumsum(shares[::-1])[::-1], 0.0)
+
+    def coverage(self, thresholds):
+
+        # thresholds has one minimum per target, NaN for targets without one
+        thresholds = numpy.asarray(thresholds, dtype=numpy.float64)
+        results = self.shares_at_least[numpy.searchsorted(self.values, numpy.nan_to_num(thresholds, nan=-numpy.inf), side="left")]
+        results[numpy.isnan(thresholds)] = 1.0
+        return results
+
+class LabelMarginal:
+    def __init__(self, rows):
+
+        # For "one of" requirements, such as operating systems
+        rows = survey_shares(rows)
+        self.labels = [name for (name, share) in rows]
+        self.shares = numpy.array([share for (name, share) in rows], dtype=numpy.float64)
+
+    def coverage(self, allowed_label_lists):
+
+        # allowed_label_lists has one list per target, None for targets without one
+        # A survey label matches an allowed one it starts with, so "Windows 11" covers "Windows 11 64 bit"
+        matches = numpy.ones((len(allowed_label_lists), len(self.labels)), dtype=bool)
+        for target_position, allowed_labels in enumerate(allowed_label_lists):
+            if allowed_labels != None:
+                matches[target_position] = [any(label.startswith(allowed_label) for allowed_label in allowed_labels) for label in self.labels]
+        results = matches.astype(numpy.float64) @ self.shares
+        results[[allowed_labels == None for allowed_labels in allowed_label_lists]] = 1.0
+        return results
+
+class ComponentCoverage:
+    def __init__(self, target_configuration_names, component_names, coverages, joint_model):
+
+        # coverages is a components x targets matrix, the GPU first; a target without requirements on a component has coverage 1 for it
+        self.target_configuration_names = target_configuration_names
+        self.component_names = component_names
+        self.coverages = coverages
+        self.joint_model = joint_model
+        self.joint_coverage = joint_coverage(coverages, joint_model)
+
+def joint_coverage(coverages, joint_model):
+    if joint_model == "independent":
+        return coverages.prod(axis=0)
+    if joint_model == "min":
+        return coverages.min(axis=0)
+    if joint_model == "lower_bound":
+        return numpy.maximum(coverages.sum(axis=0) - (len(coverages) - 1), 0.0)
+    raise Exception(f"Unknown joint model {joint_model}, expected one of {', '.join(JOINT_MODELS)}")
+
+@timed("component_coverage")
+def analyze_component_coverage(steam_db, target_configuration_db, analyzed_cards, joint_model=JOINT_MODEL_DEFAULT):
+
+    # Each analyzed target's GPU market share, combined with its coverage in each other survey category it has requirements on
+    # The survey only publishes per-category shares, so the joint share of users meeting everything is estimated with joint_model
+    target_configurations = [target_configuration for (target_configuration_name, target_configuration) in target_configuration_db.items() if target_configuration_name in analyzed_cards]
+    for category, requirement in [(STEAM_DB_CPU_CORES_CATEGORY, "min_cpu_cores"), (STEAM_DB_SYSTEM_RAM_CATEGORY, "min_ram_gb"), (STEAM_DB_OS_CATEGORY, "operating_systems")]:
+        if len(steam_db.category(category)) == 0 and any(getattr(target_configuration, requirement) != None for target_configuration in target_configurations):
+            raise Exception(f"The Steam survey of {steam_db.date} has no {category} category")
+
+    gpu_coverage = numpy.array([analyzed_cards[target_configuration.name].market_share for target_configuration in target_configurations], dtype=numpy.float64)
+
+    cpu_cores_coverage = QuantityMarginal(steam_db.category(STEAM_DB_CPU_CORES_CATEGORY)).coverage(
+        [target_configuration.min_cpu_cores if target_configuration.min_cpu_cores != None else math.nan for target_configuration in target_configurations])
+    ram_coverage = QuantityMarginal(steam_db.category(STEAM_DB_SYSTEM_RAM_CATEGORY)).coverage(
+        [target_configuration.min_ram_gb if target_configuration.min_ram_gb != None else math.nan for target_configuration in target_configurations])
+    os_coverage = LabelMarginal(steam_db.category(STEAM_DB_OS_CATEGORY)).coverage(
+        [target_configuration.operating_systems for target_configuration in target_configurations])
+
+    return ComponentCoverage([target_configuration.name for target_configuration in target_configurations], ["GPU", "CPU cores", "RAM", "OS"],
+        numpy.vstack([gpu_coverage, cpu_cores_coverage, ram_coverage, os_coverage]), joint_model)
+
+def write_component_coverage_csv(component_coverage, console_rows=None):
+
+    header = ["Configuration"] + [f"{component_name} coverage" for component_name in component_coverage.component_names] + [f"Joint coverage ({component_coverage.joint_model})"]
+    rows = []
+    for position, target_configuration_name in enumerate(component_coverage.target_configuration_names):
+        rows.append([target_configuration_name] + [f"{coverage * 100:.2f}%" for coverage in component_coverage.coverages[:, position]] + [f"{component_coverage.joint_coverage[position] * 100:.2f}%"])
+
+    with open(COMPONENT_COVERAGE_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    print(f"Results written to {COMPONENT_COVERAGE_FILE}")
+
+    if console_rows != 0:
+        print(tabulate(rows, headers=header, tablefmt='fancy_grid'))
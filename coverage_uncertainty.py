@@ -0,0 +1,95 @@
+import concurrent.futures
+import csv
+import numpy
+from tabulate import tabulate
+
+from card_table import target_chunks
+from instrumentation import timed
+
+COVERAGE_UNCERTAINTY_FILE="output/coverage_uncertainty.csv"
+
+COVERAGE_UNCERTAINTY_RESAMPLES=10000
+COVERAGE_UNCERTAINTY_CONFIDENCE=0.95
+COVERAGE_UNCERTAINTY_SEED=0
+
+# Steam doesn't publish how many users each monthly survey samples; this is the assumed number of respondents
+COVERAGE_UNCERTAINTY_SAMPLE_SIZE=100000
+
+# Resamples drawn per matrix product, to bound memory at about batch size x surveyed cards floats
+# Each batch has its own random stream, so results are the same however batches are spread over processes
+COVERAGE_UNCERTAINTY_BATCH_SIZE=1000
+
+def resample_market_shares(concentration, total_popularity, eligibility, resample_count, seed):
+
+    # Dirichlet draws of the surveyed cards' popularity, as normalized Gamma draws, times the cards x targets eligibility
+    # Returns a resamples x targets matrix of market shares, filled a chunk of targets at a time
+    generator = numpy.random.default_rng(seed)
+    popularity = generator.gamma(concentration, size=(resample_count, len(concentration)))
+    popularity *= total_popularity / popularity.sum(axis=1, keepdims=True)
+    market_shares = numpy.zeros((resample_count, len(eligibility)))
+    for chunk in target_chunks(len(eligibility), len(concentration)):
+        market_shares[:, chunk] = popularity @ eligibility[chunk].T.astype(numpy.float64)
+    return market_shares
+
+class CoverageUncertainty:
+    def __init__(self, target_configuration_names, market_shares, resampled_market_shares, confidence):
+        self.target_configuration_names = target_configuration_names
+        self.market_shares = market_shares
+        self.mean = resampled_market_shares.mean(axis=0)
+        self.standard_deviation = resampled_market_shares.std(axis=0)
+        self.confidence = confidence
+        self.lower, self.upper = numpy.quantile(resampled_market_shares, [(1.0 - confidence) / 2.0, (1.0 + confidence) / 2.0], axis=0)
+
+@timed("coverage_uncertainty")
+def analyze_coverage_uncertainty(card_table, analyzed_cards, removed_popularity, resample_count=COVERAGE_UNCERTAINTY_RESAMPLES, sample_size=COVERAGE_UNCERTAINTY_SAMPLE_SIZE,
+        confidence=COVERAGE_UNCERTAINTY_CONFIDENCE, workers=1, seed=COVERAGE_UNCERTAINTY_SEED):
+
+    # Survey percentages are estimates from a sample of users, so each target's market share is too
+    # The survey is modeled as a multinomial sample of sample_size users, whose posterior card shares are Dirichlet(sample_size x share)
+    # Dropping "Other" and renormalizing the rest, like SteamDB.remove() does, leaves a Dirichlet over the remaining cards,
+    #   with the concentration of the respondents that remain, so resamples are drawn over the surveyed cards directly
+    target_configuration_names = list(analyzed_cards.keys())
+    requirements_list = [analyzed_cards[target_configuration_name].requirements for target_configuration_name in target_configuration_names]
+    market_shares = numpy.array([analyzed_cards[target_configuration_name].market_share for target_configuration_name in target_configuration_names])
+
+    # Survey rows don't add up to exactly 100%; resamples keep the same total, so the unlisted remainder stays uncovered
+    surveyed = card_table.popularity > 0.0
+    total_popularity = card_table.popularity[surveyed].sum()
+    concentration = card_table.popularity[surveyed] * (1.0 - removed_popularity) * sample_size
+
+    # Only the surveyed cards' columns are kept, a chunk of targets at a time
+    eligibility = numpy.zeros((len(requirements_list), numpy.count_nonzero(surveyed)), dtype=bool)
+    for chunk in target_chunks(len(requirements_list), len(card_table)):
+        eligibility[chunk] = card_table.eligibility(requirements_list[chunk])[:, surveyed]
+
+    batch_sizes = [min(COVERAGE_UNCERTAINTY_BATCH_SIZE, resample_count - start) for start in range(0, resample_count, COVERAGE_UNCERTAINTY_BATCH_SIZE)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(batch_sizes))
+    arguments = ([concentration] * len(batch_sizes), [total_popularity] * len(batch_sizes), [eligibility] * len(batch_sizes), batch_sizes, seeds)
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(resample_market_shares, *arguments))
+    else:
+        batches = list(map(resample_market_shares, *arguments))
+
+    print(f"Resampled market shares {resample_count} times for {len(target_configuration_names)} target configurations")
+    return CoverageUncertainty(target_configuration_names, market_shares, numpy.concatenate(batches), confidence)
+
+def write_coverage_uncertainty_csv(coverage_uncertainty, console_rows=None):
+
+    confidence_percent = f"{coverage_uncertainty.confidence * 100:g}%"
+    header = ["Configuration", "Market coverage", "Mean", "Standard deviation", f"{confidence_percent} interval low", f"{confidence_percent} interval high"]
+    rows = []
+    for position, target_configuration_name in enumerate(coverage_uncertainty.target_configuration_names):
+        rows.append([target_configuration_name] + [f"{value * 100:.2f}%" for value in (coverage_uncertainty.market_shares[position], coverage_uncertainty.mean[position],
+            coverage_uncertainty.standard_deviation[position], coverage_uncertainty.lower[position], coverage_uncertainty.upper[position])])
+
+    with open(COVERAGE_UNCERTAINTY_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    print(f"Results written to {COVERAGE_UNCERTAINTY_FILE}")
+
+    if console_rows != 0:
+        print(tabulate(rows, headers=header, tablefmt='fancy_grid'))
@@ -1,19 +1,76 @@
+import argparse
+import concurrent.futures
 import json
-import pickle
+import os
 import requests
+import sys
+import time
 
+from cache_store import CacheStore, read_legacy_pickle
+from card_name_resolver import architecture_id_from_name, architecture_name_from_id
+from instrumentation import count, timed
+from snapshot_store import Snapshot, snapshot_path, write_snapshot
+
+GPU_ARCHITECTURE_DB_CACHE_FILE="cache/gpu_architecture_db_cache.sqlite"
 GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE="cache/gpu_architecture_db_cache.bin"
 GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE="cache/gpu_architecture_db_cache.txt"
 
+GPU_ARCHITECTURE_DB_SNAPSHOT_COLUMNS=[("name", "str"), ("compute_unit_count", "int"), ("alu_count", "int"), ("single_precision_performance_tflops", "float"),
+    ("base_frequency_hz", "int"), ("turbo_frequency_hz", "int"), ("memory_bus_width_bits", "int"), ("memory_frequency_hz", "float"), ("memory_size_bytes", "int"),
+    ("memory_type", "str"), ("release_date", "str"), ("vendor", "str"), ("asic_name", "str")]
+
+GPU_ARCHITECTURE_DB_GRAPHQL_URL="https://db.thegpu.guru/graphql"
+GPU_ARCHITECTURE_DB_FETCH_BATCH_SIZE=10
+GPU_ARCHITECTURE_DB_FETCH_WORKERS=8
+
+# Cards are refetched by a refresh once older than the positive TTL; cards the DB didn't have are looked up again once older than the negative TTL
+GPU_ARCHITECTURE_DB_TTL_DAYS=float(os.environ.get("GPU_ARCHITECTURE_DB_TTL_DAYS", "90"))
+GPU_ARCHITECTURE_DB_NEGATIVE_TTL_DAYS=float(os.environ.get("GPU_ARCHITECTURE_DB_NEGATIVE_TTL_DAYS", "7"))
+
+GPU_ARCHITECTURE_DB_CARD_FIELDS="""
+                        name,
+                        computeUnitCount,
+                        aluCount,
+                        singlePrecisionPerformance,
+                        baseFrequency,
+                        turboFrequency,
+                        memoryBusWidth,
+                        memoryFrequency,
+                        memorySize,
+                        memoryType,
+                        releaseDate,
+                        vendor,
+                        asic { name }
+"""
+
 class GPUArchitectureDB:
-    def __init__(self):
+    def __init__(self, ttl_days=GPU_ARCHITECTURE_DB_TTL_DAYS, negative_ttl_days=GPU_ARCHITECTURE_DB_NEGATIVE_TTL_DAYS):
+        self.ttl_days = ttl_days
+        self.negative_ttl_days = negative_ttl_days
+
+        # Names whose cache hit or miss prefetch_names() has counted already, so that looking them up again doesn't count them twice
+        self.prefetched_names = set()
+
         self.read_cache()
 
     def get(self, card_id):
-        card_name = GPUArchitectureDB.id_to_name(card_id)
-        found, gpu = self.cache.get(card_name)
+        return self.get_by_name(GPUArchitectureDB.id_to_name(card_id))
+
+    def get_by_name(self, card_name):
+        found, gpu = self.lookup(card_name)
+        if not card_name in self.prefetched_names:
+            count("gpu_architecture_db.cache_hits" if found else "gpu_architecture_db.cache_misses")
         if not found:
-            found, gpu = GPUArchitectureDB.fetch_from_server(card_name)
+            self.load_cache()
+            try:
+                found, gpu = GPUArchitectureDB.fetch_from_server(card_name)
+            except requests.RequestException as e:
+                if not self.cache.is_expired(card_name):
+                    raise
+                print(f"Unable to look {card_name} up again in GPU architecture DB ({e}), keeping it unknown")
+                count("gpu_architecture_db.fetch_errors")
+                self.cache.keep_expired(card_name)
+                return None
             if found:
                 self.cache.add_card(card_name, gpu)
             else:
@@ -21,142 +78,350 @@ class GPUArchitectureDB:
             self.write_cache()
         return gpu
 
+    def lookup(self, card_name):
+
+        # From the cache once it has been read whole, or else from the snapshot, where unknowns past the negative TTL are misses too
+        if self.cache != None:
+            return self.cache.get(card_name)
+        found, gpu, fetched_at = self.snapshot.lookup(card_name)
+        if found and gpu == None and fetched_at < self.expiry_time:
+            return False, None
+        return found, gpu
+
+    def prefetch(self, card_ids):
+        self.prefetch_names([GPUArchitectureDB.id_to_name(card_id) for card_id in card_ids])
+
+    def prefetch_names(self, names):
+
+        # Resolve all cache misses up front, with several names per GraphQL request and several requests in flight,
+        #   and persist the cache once at the end rather than once per miss
+        card_names = []
+        for card_name in dict.fromkeys(names):
+            found, gpu = self.lookup(card_name)
+            if not card_name in self.prefetched_names:
+                count("gpu_architecture_db.cache_hits" if found else "gpu_architecture_db.cache_misses")
+                self.prefetched_names.add(card_name)
+            if not found:
+                card_names.append(card_name)
+
+        if len(card_names) == 0:
+            return
+
+        self.load_cache()
+        print(f"Fetching {len(card_names)} cards from GPU architecture DB")
+
+        results = self.fetch_names(card_names)
+        for card_name, (found, gpu) in results.items():
+            if found:
+                self.cache.add_card(card_name, gpu)
+            else:
+                self.cache.add_unknown(card_name)
+
+        # Names whose batch failed stay unknown for this run, rather than being fetched once more one by one
+        # They aren't stored, so the next run looks them up again
+        unavailable_card_names = [card_name for card_name in card_names if not card_name in results]
+        if len(unavailable_card_names) > 0:
+            print(f"Unable to fetch {len(unavailable_card_names)} cards from GPU architecture DB, keeping them unknown for this run")
+        for card_name in unavailable_card_names:
+            self.cache.keep_unavailable(card_name)
+
+        self.write_cache()
+
+    def fetch_names(self, card_names):
+
+        # Several names per GraphQL request, and several requests in flight
+        # Returns name -> (found, entry) for the names whose batch was fetched; failed batches are left out
+        results = dict()
+        batches = [card_names[i:i + GPU_ARCHITECTURE_DB_FETCH_BATCH_SIZE] for i in range(0, len(card_names), GPU_ARCHITECTURE_DB_FETCH_BATCH_SIZE)]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=GPU_ARCHITECTURE_DB_FETCH_WORKERS) as executor:
+            futures = [executor.submit(GPUArchitectureDB.fetch_batch_from_server, batch) for batch in batches]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.update(future.result())
+                except requests.RequestException as e:
+                    print(f"Error while fetching from GPU architecture DB: {e}")
+                    count("gpu_architecture_db.fetch_errors")
+
+        return results
+
+    @timed("gpu_architecture_db.refresh")
+    def refresh(self, include_all_unknowns=False):
+
+        # Refetch cards older than the positive TTL and unknowns older than the negative TTL (or every unknown), and nothing else
+        # The store is only updated once at the end, so other runs keep reading the previous entries meanwhile
+        self.load_cache()
+        now = time.time()
+        stale_card_names = [card_name for (card_name, gpu, fetched_at) in self.store.fetched_before(now - self.ttl_days * 24 * 60 * 60) if gpu != None]
+        unknown_card_names = [card_name for (card_name, gpu, fetched_at) in self.store.fetched_before(now if include_all_unknowns else now - self.negative_ttl_days * 24 * 60 * 60) if gpu == None]
+        print(f"Refreshing GPU architecture DB, {len(stale_card_names)} stale cards & {len(unknown_card_names)} unknowns")
+
+        results = self.fetch_names(stale_card_names + unknown_card_names)
+        for card_name, (found, gpu) in results.items():
+            if found:
+                self.cache.add_card(card_name, gpu)
+            elif card_name in unknown_card_names:
+                self.cache.add_unknown(card_name)
+            else:
+                # A card the DB used to have is kept as it was, and retried by the next refresh
+                print(f"{card_name} is no longer found in GPU architecture DB, keeping the cached entry")
+                count("gpu_architecture_db.refresh_not_found")
+
+        self.write_cache()
+        return len(results), len(stale_card_names) + len(unknown_card_names)
+
+    def card_names(self):
+        return self.load_cache().card_names()
+
+    @timed("gpu_architecture_db.read_cache")
     def read_cache(self):
-        try:
-            with open(GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE, 'rb') as gpu_architecture_db_cache_file:
-                self.cache = pickle.load(gpu_architecture_db_cache_file)
-                print(f"Read GPU architecture DB cache, {len(self.cache.cards)} cards & {len(self.cache.unknowns)} unknowns")
-        except:
+        self.store = CacheStore(GPU_ARCHITECTURE_DB_CACHE_FILE)
+
+        # Unknowns fetched before the expiry time are treated as misses, so they are looked up again when needed
+        # Cards past the positive TTL keep being used until a refresh replaces them
+        now = time.time()
+        self.expiry_time = now - self.negative_ttl_days * 24 * 60 * 60
+        self.open_cache()
+
+        expired_card_count = len([card_name for (card_name, is_card) in self.fetched_before(self.expiry_time) if not is_card])
+        stale_card_count = len([card_name for (card_name, is_card) in self.fetched_before(now - self.ttl_days * 24 * 60 * 60) if is_card])
+        if expired_card_count > 0 or stale_card_count > 0:
+            print(f"GPU architecture DB cache has {expired_card_count} expired unknowns & {stale_card_count} cards older than {self.ttl_days:g} days, see refresh_caches.py")
+
+    def fetched_before(self, cutoff_time):
+
+        # (name, whether it is a card) for the entries fetched before cutoff_time, from the snapshot's fetch times if there is one
+        if self.snapshot != None:
+            return self.snapshot.fetched_before(cutoff_time)
+        return [(card_name, gpu != None) for (card_name, gpu, fetched_at) in self.store.fetched_before(cutoff_time)]
+
+    def open_cache(self):
+        self.cache = None
+        self.snapshot = None
+        if self.store.is_empty():
             self.cache = GPUArchitectureDBCache()
+            legacy_cache = read_legacy_pickle(GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE)
+            if legacy_cache != None:
+                for card_name, gpu in legacy_cache.cards.items():
+                    self.cache.add_card(card_name, gpu)
+                for unknown_card_name in legacy_cache.unknowns:
+                    self.cache.add_unknown(unknown_card_name)
+                self.write_cache()
+            self.store.set_record_format_current()
+            return
+
+        # A snapshot of the current version of the store answers lookups without reading the whole store
+        # Analyses that join every card, and anything that caches new entries, read the store whole anyway, through load_cache()
+        if self.store.is_record_format_current():
+            self.snapshot = Snapshot.open(snapshot_path(self.store.path), self.store.version(), GPUArchitectureDBEntry)
+        if self.snapshot != None:
+            print(f"Opened GPU architecture DB snapshot, {len(self.snapshot)} entries")
+        else:
+            self.load_cache()
+
+    def load_cache(self):
+        if self.cache != None:
+            return self.cache
 
+        version, records = self.store.versioned_items()
+        self.cache = GPUArchitectureDBCache()
+        for card_name, gpu, fetched_at in records:
+            if gpu != None:
+                self.cache.cards[card_name] = gpu
+            else:
+                self.cache.unknowns.add(card_name)
+        self.cache.expire([card_name for (card_name, gpu, fetched_at) in records if gpu == None and fetched_at != None and fetched_at < self.expiry_time])
+        print(f"Read GPU architecture DB cache, {len(self.cache.cards)} cards & {len(self.cache.unknowns)} unknowns")
+        if not self.store.is_record_format_current():
+            self.store.rewrite_records(dict(self.cache.items()))
+        elif self.snapshot == None:
+            self.write_snapshot(version, records)
+        return self.cache
+
+    @timed("gpu_architecture_db.write_cache")
     def write_cache(self):
-        with open(GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE, 'wb') as gpu_architecture_db_cache_file:
-            pickle.dump(self.cache, gpu_architecture_db_cache_file)
-            print(f"Written GPU architecture DB cache, {len(self.cache.cards)} cards & {len(self.cache.unknowns)} unknowns")
+        changes = self.cache.take_changes()
+        self.store.put_many(changes)
+        print(f"Written GPU architecture DB cache, {len(changes)} changed entries")
+        if len(changes) > 0:
+            self.write_snapshot(*self.store.versioned_items())
+
+    def write_snapshot(self, version, records):
+        try:
+            write_snapshot(snapshot_path(self.store.path), version, GPU_ARCHITECTURE_DB_SNAPSHOT_COLUMNS, records)
+        except (OSError, ValueError) as e:
+            print(f"Unable to write GPU architecture DB snapshot ({e}), later runs will read the whole cache")
 
+    def write_text(self):
+        items = list(self.load_cache().items())
         with open(GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE, 'wt') as gpu_architecture_db_cache_file:
             gpu_architecture_db_cache_file.write("Cards:\n")
-            for card_name, gpu_entry in self.cache.cards.items():
-                gpu_architecture_db_cache_file.write(f"  {card_name}: {gpu_entry}\n")
+            for card_name, gpu_entry in items:
+                if gpu_entry != None:
+                    gpu_architecture_db_cache_file.write(f"  {card_name}: {gpu_entry}\n")
 
             gpu_architecture_db_cache_file.write("Unknowns:\n")
-            for unknown_card_name in self.cache.unknowns:
-                gpu_architecture_db_cache_file.write(f"  {unknown_card_name}\n")
+            for card_name, gpu_entry in items:
+                if gpu_entry == None:
+                    gpu_architecture_db_cache_file.write(f"  {card_name}\n")
+
+        print(f"Written {GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE}")
 
     @staticmethod
     def id_to_name(card_id):
-        if card_id == 'NVIDIA GeForce RTX 2060':
-            return 'RTX 2060 (Founders Edition)' # This should have been mapped to Reference, but there is no such in the DB. Founders Edition is close though
-        elif card_id == 'NVIDIA GeForce RTX 2070':
-            return 'RTX 2070 (Reference)'
-        elif card_id == 'NVIDIA GeForce RTX 2080':
-            return 'RTX 2080 (Reference)'
-        elif card_id == 'NVIDIA GeForce RTX 2080 Ti':
-            return 'RTX 2080 Ti (Reference)'
-        else:
-            return card_id.removeprefix('AMD Radeon ').removeprefix('NVIDIA GeForce ').replace('SUPER', 'Super')
+        return architecture_name_from_id(card_id)
 
     @staticmethod
     def name_to_id(name):
-        if name == 'RTX 2060 (Founders Edition)':
-            return 'NVIDIA GeForce RTX 2060'
-        elif name == 'RTX 2070 (Reference)':
-            return 'NVIDIA GeForce RTX 2070'
-        elif name == 'RTX 2080 (Reference)':
-            return 'NVIDIA GeForce RTX 2080'
-        elif name == 'RTX 2080 Ti (Reference)':
-            return 'NVIDIA GeForce RTX 2080 Ti'
-        elif name.startswith('RX '):
-            return f"AMD Radeon RX {name}"
-        elif name.startswith('GTX '):
-            return f"NVIDIA GeForce GTX {name}".replace("Super", "SUPER")
-        elif name.startswith('RTX '):
-            return f"NVIDIA GeForce RTX {name}".replace("Super", "SUPER")
-        else:
-            return name
+        return architecture_id_from_name(name)
 
     @staticmethod
     def fetch_from_server(gpu_name):
+        return GPUArchitectureDB.fetch_batch_from_server([gpu_name])[gpu_name]
+
+    @staticmethod
+    @timed("gpu_architecture_db.fetch")
+    def fetch_batch_from_server(gpu_names):
 
         # GraphQL query
-        # This is intended to search for a single entry in the GPU DB
-        # However, since the query is a substring search on GPU name, we ask for as many matches as we can (max 10 supported by the server)
+        # This is intended to search for a set of entries in the GPU DB, with one aliased search per GPU name
+        # However, since each search is a substring search on GPU name, we ask for as many matches as we can (max 10 supported by the server)
         #   and do exact comparison later
         # We might need to do pagination in case there are more than 10 hits in the future, but the DB doesn't contain that many similar entries yet
 
-        query = """
-                {
-                search(query:"{gpu_name}",type:CARD,first:10) {
-                    edges {
-                    node {
-                        ... on Card {
-                        name,
-                        computeUnitCount,
-                        aluCount,
-                        singlePrecisionPerformance,
-                        baseFrequency,
-                        turboFrequency,
-                        memoryBusWidth,
-                        memoryFrequency,
-                        memorySize,
-                        memoryType,
-                        releaseDate,
-                        vendor,
-                        asic { name }
-                        }
-                    }
-                    }
-                }
-                }
-            """.replace('{gpu_name}', gpu_name)
-
-        response = requests.get(url="https://db.thegpu.guru/graphql", data=query, headers={'Content-Type': 'application/graphql'})
-
-        if response.status_code == 200:
-            response_structure = json.loads(response.content)
-            for node in response_structure['data']['search']['edges']:
-
-                inner_node = node['node']
-                name = inner_node['name']
-
-                if name == gpu_name:
-                    return True, GPUArchitectureDBEntry(name=name,
-                        compute_unit_count=int(inner_node['computeUnitCount']),
-                        alu_count=int(inner_node['aluCount']),
-                        single_precision_performance_tflops=float(inner_node['singlePrecisionPerformance']),
-                        base_frequency_hz=int(inner_node['baseFrequency']),
-                        turbo_frequency_hz=int(inner_node['turboFrequency']) if inner_node['turboFrequency'] != None else None,
-                        memory_bus_width_bits=int(inner_node['memoryBusWidth']),
-                        memory_frequency_hz=float(inner_node['memoryFrequency']),
-                        memory_size_bytes=int(inner_node['memorySize']),
-                        memory_type=inner_node['memoryType'],
-                        release_date=inner_node['releaseDate'],
-                        vendor=inner_node['vendor'],
-                        asic_name=inner_node['asic']['name'])
-
-        return False, None
+        searches = "".join(f"""
+                gpu{index}: search(query:{json.dumps(gpu_name)},type:CARD,first:10) {{
+                    edges {{
+                    node {{
+                        ... on Card {{{GPU_ARCHITECTURE_DB_CARD_FIELDS}                        }}
+                    }}
+                    }}
+                }}""" for (index, gpu_name) in enumerate(gpu_names))
+
+        query = f"""
+                {{{searches}
+                }}
+            """
+
+        response = requests.get(url=GPU_ARCHITECTURE_DB_GRAPHQL_URL, data=query, headers={'Content-Type': 'application/graphql'})
+
+        response_structure = json.loads(response.content) if response.status_code == 200 else None
+        if (response_structure == None or response_structure.get('data') == None) and len(gpu_names) > 1:
+            # The server rejected the batched document; resolve the names one at a time instead
+            results = dict()
+            for gpu_name in gpu_names:
+                results.update(GPUArchitectureDB.fetch_batch_from_server([gpu_name]))
+            return results
+
+        results = {gpu_name: (False, None) for gpu_name in gpu_names}
+
+        if response_structure != None and response_structure.get('data') != None:
+            for index, gpu_name in enumerate(gpu_names):
+                search = response_structure['data'].get(f"gpu{index}")
+                if search == None:
+                    continue
+
+                for node in search['edges']:
+
+                    inner_node = node['node']
+                    name = inner_node.get('name')
+
+                    if name == gpu_name:
+                        results[gpu_name] = (True, GPUArchitectureDB.entry_from_node(inner_node))
+                        break
+
+        return results
+
+    @staticmethod
+    def entry_from_node(inner_node):
+        return GPUArchitectureDBEntry(name=inner_node['name'],
+            compute_unit_count=int(inner_node['computeUnitCount']),
+            alu_count=int(inner_node['aluCount']),
+            single_precision_performance_tflops=float(inner_node['singlePrecisionPerformance']),
+            base_frequency_hz=int(inner_node['baseFrequency']),
+            turbo_frequency_hz=int(inner_node['turboFrequency']) if inner_node['turboFrequency'] != None else None,
+            memory_bus_width_bits=int(inner_node['memoryBusWidth']),
+            memory_frequency_hz=float(inner_node['memoryFrequency']),
+            memory_size_bytes=int(inner_node['memorySize']),
+            memory_type=inner_node['memoryType'],
+            release_date=inner_node['releaseDate'],
+            vendor=inner_node['vendor'],
+            asic_name=inner_node['asic']['name'])
 
 
 class GPUArchitectureDBCache:
     def __init__(self):
         self.cards = dict()
         self.unknowns = set()
+        self.changes = dict()
+
+        # Unknowns past their TTL, reported as misses until they are looked up again
+        self.expired = set()
+
+        # Names that couldn't be fetched this run, reported as unknown without being stored
+        self.unavailable = set()
 
     def get(self, gpu_name):
-        if gpu_name in self.unknowns:
+        if gpu_name in self.unavailable:
+            return True, None
+        elif gpu_name in self.expired:
+            return False, None
+        elif gpu_name in self.unknowns:
             return True, None
         elif gpu_name in self.cards:
             return True, self.cards[gpu_name]
         else:
             return False, None
 
+    def card_names(self):
+        return self.cards.keys()
+
+    def items(self):
+        yield from self.cards.items()
+        for gpu_name in self.unknowns:
+            yield gpu_name, None
+
     def add_card(self, gpu_name, gpu):
         self.cards[gpu_name] = gpu
+        self.unknowns.discard(gpu_name)
+        self.expired.discard(gpu_name)
+        self.unavailable.discard(gpu_name)
+        self.changes[gpu_name] = gpu
 
     def add_unknown(self, gpu_name):
         self.unknowns.add(gpu_name)
+        self.expired.discard(gpu_name)
+        self.unavailable.discard(gpu_name)
+        self.changes[gpu_name] = None
+
+    def expire(self, gpu_names):
+        self.expired.update(gpu_names)
+
+    def is_expired(self, gpu_name):
+        return gpu_name in self.expired
+
+    def keep_expired(self, gpu_name):
+
+        # Serve an expired unknown as unknown again, e.g. when the DB can't be reached
+        self.expired.discard(gpu_name)
+        self.unknowns.add(gpu_name)
+
+    def keep_unavailable(self, gpu_name):
+        self.expired.discard(gpu_name)
+        self.unavailable.add(gpu_name)
+
+    def take_changes(self):
+        changes = self.changes
+        self.changes = dict()
+        return changes
+
+def intern_string(value):
+    return sys.intern(value) if isinstance(value, str) else value
 
 class GPUArchitectureDBEntry:
+    __slots__ = ("name", "compute_unit_count", "alu_count", "single_precision_performance_tflops", "base_frequency_hz", "turbo_frequency_hz", "memory_bus_width_bits",
+        "memory_frequency_hz", "memory_size_bytes", "memory_type", "release_date", "vendor", "asic_name")
+
     def __init__(self, name, compute_unit_count, alu_count, single_precision_performance_tflops, base_frequency_hz, turbo_frequency_hz, memory_bus_width_bits, memory_frequency_hz, memory_size_bytes, memory_type, release_date, vendor, asic_name):
         self.name = name
         self.compute_unit_count = compute_unit_count
@@ -167,10 +432,19 @@ class GPUArchitectureDBEntry:
         self.memory_bus_width_bits = memory_bus_width_bits
         self.memory_frequency_hz = memory_frequency_hz
         self.memory_size_bytes = memory_size_bytes
-        self.memory_type = memory_type
+        # These repeat across many cards, so every entry shares one copy of each value
+        self.memory_type = intern_string(memory_type)
         self.release_date = release_date
-        self.vendor = vendor
-        self.asic_name = asic_name
+        self.vendor = intern_string(vendor)
+        self.asic_name = intern_string(asic_name)
+
+    # Pickled as constructor arguments rather than an attribute dict
+    def __reduce__(self):
+        return (GPUArchitectureDBEntry, tuple(getattr(self, field) for field in GPUArchitectureDBEntry.__slots__))
+
+    # Entries pickled before __slots__ carry their attributes as a dict
+    def __setstate__(self, state):
+        self.__init__(**state)
 
     def __str__(self):
         return f"{self.name}, {self.compute_unit_count} CUs, {self.alu_count} ALUs, {self.single_precision_performance_tflops} SP TFLOPs,\
@@ -181,4 +455,14 @@ class GPUArchitectureDBEntry:
         return f"Compute: {self.single_precision_performance_tflops} SP TFLOPs, VRAM: {round(self.memory_size_bytes / (1024 * 1024 * 1024), 2)} GB {self.memory_type}"
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f"Write the GPU architecture DB cache to {GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE}")
+    parser.add_argument("--lookup", nargs="+", metavar="NAME", help="instead, print the entries of these GPU architecture DB names, e.g. \"RTX 3060\", fetching the ones that aren't cached")
+    args = parser.parse_args()
+
     gpu_db = GPUArchitectureDB()
+    if args.lookup != None:
+        for card_name in args.lookup:
+            gpu = gpu_db.get_by_name(card_name)
+            print(f"{card_name}: {gpu if gpu != None else 'unknown to the GPU architecture DB'}")
+    else:
+        gpu_db.write_text()
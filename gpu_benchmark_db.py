@@ -1,71 +1,293 @@
-import pickle
+import argparse
+import html.parser
+import json
+import os
 import requests
 import time
 
-from selenium import webdriver 
-from selenium.webdriver import Chrome 
-from selenium.webdriver.common.by import By 
-from selenium.webdriver.support.select import Select
+from cache_store import CacheStore, read_legacy_pickle
+from card_name_resolver import benchmark_id_from_name, benchmark_name_from_id
+from instrumentation import count, timed
+from snapshot_store import Snapshot, snapshot_path, write_snapshot
 
-GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE="cache/gpu_benchmark_db_cache.bin"
-GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE="cache/gpu_benchmark_db_cache.txt"
+GPU_BENCHMARK_DB_CACHE_FILE="cache/gpu_benchmark_db_cache.sqlite"
+GPU_BENCHMARK_DB_CACHE_BINARY_FILE="cache/gpu_benchmark_db_cache.bin"
+GPU_BENCHMARK_DB_CACHE_TEXT_FILE="cache/gpu_benchmark_db_cache.txt"
+
+GPU_BENCHMARK_DB_SNAPSHOT_COLUMNS=[("name", "str"), ("g3d_mark", "int"), ("g2d_mark", "int")]
+
+GPU_BENCHMARK_DB_MEGA_PAGE_URL="https://www.videocardbenchmark.net/GPU_mega_page.html"
+
+# The mega page fills its table from this endpoint with JavaScript, as {"data": [{"name": ..., "g3d": ..., "g2d": ..., ...}, ...]}
+GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL="https://www.videocardbenchmark.net/data/"
+
+# "http" downloads the rows from the data endpoint without a browser, and falls back to "selenium" if that fails
+# "selenium" drives a headless Chromium over the mega page itself
+GPU_BENCHMARK_DB_FETCH_BACKEND=os.environ.get("GPU_BENCHMARK_DB_FETCH_BACKEND", "http")
+
+# The whole table comes from one page, so a refresh refetches it once the cache is older than this
+GPU_BENCHMARK_DB_TTL_DAYS=float(os.environ.get("GPU_BENCHMARK_DB_TTL_DAYS", "30"))
 
 def localized_number_to_integer(localized_number):
     return int(localized_number.replace(",", ""))
 
 class GPUBenchmarkDBEntry:
+    __slots__ = ("name", "g3d_mark", "g2d_mark")
+
     def __init__(self, name, g3d_mark, g2d_mark):
         self.name = name
         self.g3d_mark = g3d_mark
         self.g2d_mark = g2d_mark
 
+    # Pickled as constructor arguments rather than an attribute dict
+    def __reduce__(self):
+        return (GPUBenchmarkDBEntry, (self.name, self.g3d_mark, self.g2d_mark))
+
+    # Entries pickled before __slots__ carry their attributes as a dict
+    def __setstate__(self, state):
+        self.__init__(**state)
+
     def __str__(self):
         return f"{self.name}: G3D mark {self.g3d_mark}, G2D mark {self.g2d_mark}"
 
     @staticmethod
     def id_to_name(card_id):
-        return card_id.replace('NVIDIA GeForce ', 'GeForce ').replace('AMD Radeon ', 'Radeon ').replace('Intel HD Graphics ', 'Intel HD ')
+        return benchmark_name_from_id(card_id)
 
     @staticmethod
     def name_to_id(name):
-        if name.startswith('GeForce '):
-            return f"NVIDIA {name}"
-        if name.startswith('Radeon '):
-            return f"AMD {name}"
-        if name.startswith('Intel HD ') and not name.startswith('Intel HD Graphics '):
-            return name.replace('Intel HD ', 'Intel HD Graphics ')
-        return name
+        return benchmark_id_from_name(name)
+
+class MegaPageParser(html.parser.HTMLParser):
+    def __init__(self, on_row):
+        super().__init__(convert_charrefs=True)
+        self.on_row = on_row
+        self.table_depth = 0
+        self.in_body = False
+        self.columns = None
+        self.column_text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self.table_depth > 0 or dict(attrs).get("id") == "cputable":
+                self.table_depth += 1
+        elif self.table_depth == 1:
+            if tag == "tbody":
+                self.in_body = True
+            elif tag == "tr" and self.in_body:
+                self.columns = []
+            elif tag == "td" and self.columns != None:
+                self.column_text = []
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self.table_depth > 0:
+            self.table_depth -= 1
+        elif self.table_depth == 1:
+            if tag == "tbody":
+                self.in_body = False
+            elif tag == "td" and self.column_text != None:
+                self.columns.append(" ".join("".join(self.column_text).split()))
+                self.column_text = None
+            elif tag == "tr" and self.columns != None:
+                self.on_row(self.columns)
+                self.columns = None
+
+    def handle_data(self, data):
+
+        # Text of tables nested in a cell isn't part of the cell
+        if self.column_text != None and self.table_depth == 1:
+            self.column_text.append(data)
+
+def parse_mega_page(chunks):
+
+    # Single streaming pass over the mega page HTML; chunks can be any iterable of text, such as a saved file
+    results = dict()
+
+    def on_row(columns):
+        if len(columns) < 4:
+            return
+        try:
+            gpu_name = columns[1]
+            g3d_mark = localized_number_to_integer(columns[2])
+            g2d_mark = localized_number_to_integer(columns[3])
+        except ValueError:
+            return
+
+        card_id = GPUBenchmarkDBEntry.name_to_id(gpu_name)
+        results[card_id] = GPUBenchmarkDBEntry(gpu_name, g3d_mark, g2d_mark)
+
+    parser = MegaPageParser(on_row)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+    return results
+
+def parse_mega_page_data(data):
+
+    # Rows as served by the data endpoint, in one pass; marks are localized numbers like "38,195", or plain numbers
+    # Rows without both marks are left out, like on the page
+    results = dict()
+    for row in data.get("data", []):
+        try:
+            gpu_name = " ".join(str(row["name"]).split())
+            g3d_mark = localized_number_to_integer(str(row["g3d"]))
+            g2d_mark = localized_number_to_integer(str(row["g2d"]))
+        except (KeyError, ValueError):
+            continue
+
+        card_id = GPUBenchmarkDBEntry.name_to_id(gpu_name)
+        results[card_id] = GPUBenchmarkDBEntry(gpu_name, g3d_mark, g2d_mark)
+
+    return results
 
 class GPUBenchmarkDB:
-    def __init__(self):
+    def __init__(self, ttl_days=GPU_BENCHMARK_DB_TTL_DAYS):
+        self.ttl_days = ttl_days
+
+        # Whether opening the cache fetched the page, as it does for an empty cache
+        self.fetched_on_open = False
+
         self.read_cache()
 
     def get(self, card_id):
+
+        # Looked up in the snapshot until the whole cache is needed and read
+        if self.cache == None:
+            found, entry, fetched_at = self.snapshot.lookup(card_id)
+            return entry
         return self.cache.get(card_id)
 
+    @timed("gpu_benchmark_db.read_cache")
     def read_cache(self):
-        try:
-            with open(GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE, 'rb') as gpu_benchmark_db_cache_file:
-                self.cache = pickle.load(gpu_benchmark_db_cache_file)
-                print(f"Read GPU Benchmark DB cache, {len(self.cache.entries)} entries")
-        except:
-            self.cache = GPUBenchmarkDB.fetch_from_server()
+        self.store = CacheStore(GPU_BENCHMARK_DB_CACHE_FILE)
+        self.open_cache()
+
+        # A stale cache keeps being used; refetching the page is left to a refresh
+        if self.is_stale():
+            print(f"GPU Benchmark DB cache is older than {self.ttl_days:g} days, see refresh_caches.py")
+
+    def open_cache(self):
+        self.cache = None
+        self.snapshot = None
+        if self.store.is_empty():
+            legacy_cache = read_legacy_pickle(GPU_BENCHMARK_DB_CACHE_BINARY_FILE)
+            self.cache = legacy_cache if legacy_cache != None else GPUBenchmarkDB.fetch_from_server()
+            self.fetched_on_open = legacy_cache == None
             self.write_cache()
+            self.store.set_record_format_current()
+            return
+
+        # A snapshot of the current version of the store answers lookups without reading the whole store
+        # Analyses that join every card read the store whole anyway, through load_cache()
+        if self.store.is_record_format_current():
+            self.snapshot = Snapshot.open(snapshot_path(self.store.path), self.store.version(), GPUBenchmarkDBEntry)
+        if self.snapshot != None:
+            print(f"Opened GPU Benchmark DB snapshot, {len(self.snapshot)} entries")
+        else:
+            self.load_cache()
 
+    def load_cache(self):
+        if self.cache != None:
+            return self.cache
+
+        version, records = self.store.versioned_items()
+        self.cache = GPUBenchmarkDBCache({card_id: gpu_entry for (card_id, gpu_entry, fetched_at) in records})
+        print(f"Read GPU Benchmark DB cache, {len(self.cache.entries)} entries")
+        if not self.store.is_record_format_current():
+            self.store.rewrite_records(self.cache.entries)
+        elif self.snapshot == None:
+            self.write_snapshot(version, records)
+        return self.cache
+
+    @timed("gpu_benchmark_db.write_cache")
     def write_cache(self):
-        with open(GPU_ARCHITECTURE_DB_CACHE_BINARY_FILE, 'wb') as gpu_benchmark_db_cache_file:
-            pickle.dump(self.cache, gpu_benchmark_db_cache_file)
-            print(f"Written GPU Benchmark DB cache, {len(self.cache.entries)} entries")
 
-        with open(GPU_ARCHITECTURE_DB_CACHE_TEXT_FILE, 'wt') as gpu_benchmark_db_cache_file:
-            for card_id, gpu_entry in self.cache.entries.items():
+        # The whole table comes from one page, so the entries are replaced as a whole: cards the page no longer lists are dropped,
+        #   and every entry is as old as the page
+        self.store.replace_all(self.cache.entries)
+        print(f"Written GPU Benchmark DB cache, {len(self.cache.entries)} entries")
+        self.write_snapshot(*self.store.versioned_items())
+
+    def write_snapshot(self, version, records):
+        try:
+            write_snapshot(snapshot_path(self.store.path), version, GPU_BENCHMARK_DB_SNAPSHOT_COLUMNS, records)
+        except (OSError, ValueError) as e:
+            print(f"Unable to write GPU Benchmark DB snapshot ({e}), later runs will read the whole cache")
+
+    def is_stale(self):
+
+        # Every entry comes from the same page, so the cache is as old as the last time the page was fetched
+        last_fetch_time = self.store.last_fetch_time()
+        return last_fetch_time != None and last_fetch_time < time.time() - self.ttl_days * 24 * 60 * 60
+
+    @timed("gpu_benchmark_db.refresh")
+    def refresh(self, force=False):
+
+        # Refetch the page if the cache is past its TTL; the store keeps the previous entries until the new ones are written
+        # Returns whether the cache was refetched
+        if self.fetched_on_open:
+            print("GPU Benchmark DB cache was fetched when opened")
+            return True
+        if not force and not self.is_stale():
+            print("GPU Benchmark DB cache is up to date")
+            return False
+        self.cache = GPUBenchmarkDB.fetch_from_server()
+        self.write_cache()
+        return True
+
+    def write_text(self):
+        with open(GPU_BENCHMARK_DB_CACHE_TEXT_FILE, 'wt') as gpu_benchmark_db_cache_file:
+            for card_id, gpu_entry in self.load_cache().entries.items():
                 gpu_benchmark_db_cache_file.write(f"{card_id}: {gpu_entry}\n")
 
+        print(f"Written {GPU_BENCHMARK_DB_CACHE_TEXT_FILE}")
+
     def items(self):
-        return self.cache.entries.items()
+        return self.load_cache().entries.items()
+
+    def card_ids(self):
+        return self.load_cache().entries.keys()
 
     @staticmethod
+    @timed("gpu_benchmark_db.fetch")
     def fetch_from_server():
+        if GPU_BENCHMARK_DB_FETCH_BACKEND == "selenium":
+            return GPUBenchmarkDB.fetch_from_server_selenium()
+        try:
+            return GPUBenchmarkDB.fetch_from_server_http()
+        except Exception as e:
+            print(f"Unable to fetch GPU Benchmark DB over HTTP ({e}), falling back to Selenium")
+            count("gpu_benchmark_db.selenium_fallbacks")
+            return GPUBenchmarkDB.fetch_from_server_selenium()
+
+    @staticmethod
+    def fetch_mega_page_data():
+
+        # Requested like the page's own script does, in a session that has loaded the page first
+        with requests.Session() as session:
+            session.get(GPU_BENCHMARK_DB_MEGA_PAGE_URL)
+            response = session.get(GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL, headers={"X-Requested-With": "XMLHttpRequest", "Referer": GPU_BENCHMARK_DB_MEGA_PAGE_URL})
+        if response.status_code != 200:
+            print(f"Error while fetching {GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL}, status code {response.status_code}")
+            raise Exception(f"Error fetching {GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL}")
+        return response.content
+
+    @staticmethod
+    def fetch_from_server_http():
+        results = parse_mega_page_data(json.loads(GPUBenchmarkDB.fetch_mega_page_data()))
+        if len(results) == 0:
+            raise Exception(f"No rows found in {GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL}")
+        return GPUBenchmarkDBCache(results)
+
+    @staticmethod
+    def fetch_from_server_selenium():
+
+        # Selenium is only needed for this backend, so it is imported on demand
+        from selenium import webdriver
+        from selenium.webdriver import Chrome
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.select import Select
 
         # Define the Chrome webdriver options
         options = webdriver.ChromeOptions() 
@@ -77,33 +299,28 @@ class GPUBenchmarkDB:
 
         # Pass the defined options objects to initialize the web driver 
         driver = Chrome(options=options) 
-        # Set an implicit wait of 5 seconds to allow time for elements to appear before throwing an exception
-        driver.implicitly_wait(5)
 
-        url = "https://www.videocardbenchmark.net/GPU_mega_page.html"
-        
-        driver.get(url) 
-        time.sleep(5)
+        url = GPU_BENCHMARK_DB_MEGA_PAGE_URL
 
-        # Click "all" in the dropdown
-        select_element = driver.find_element(By.NAME, 'cputable_length')
-        select = Select(select_element)
-        select.select_by_visible_text('All')
-
-        # Extract results
-        cpu_table = driver.find_element(By.ID, "cputable")
-        cpu_table_rows = cpu_table.find_elements(By.XPATH, "//tbody/tr")
+        # The browser is closed whatever happens, rather than left running when the page doesn't load as expected
+        try:
+            # Set an implicit wait of 5 seconds to allow time for elements to appear before throwing an exception
+            driver.implicitly_wait(5)
 
-        results = dict()
+            driver.get(url) 
+            time.sleep(5)
 
-        for cpu_table_row in cpu_table_rows:
-            columns = cpu_table_row.find_elements(By.TAG_NAME, "td")
-            gpu_name = columns[1].text
-            g3d_mark = localized_number_to_integer(columns[2].text)
-            g2d_mark = localized_number_to_integer(columns[3].text)
+            # Click "all" in the dropdown
+            select_element = driver.find_element(By.NAME, 'cputable_length')
+            select = Select(select_element)
+            select.select_by_visible_text('All')
 
-            card_id = GPUBenchmarkDBEntry.name_to_id(gpu_name)
-            results[card_id] = GPUBenchmarkDBEntry(gpu_name, g3d_mark, g2d_mark)
+            # Extract results
+            # Fetch the rendered table's HTML in one WebDriver call and parse it locally, rather than one call per cell
+            cpu_table = driver.find_element(By.ID, "cputable")
+            results = parse_mega_page([cpu_table.get_attribute("outerHTML")])
+        finally:
+            driver.quit()
 
         return GPUBenchmarkDBCache(results)
 
@@ -116,5 +333,21 @@ class GPUBenchmarkDBCache:
         return self.entries.get(card_id)
 
 if __name__ == '__main__':
-    gpu_benchmark_db = GPUBenchmarkDB()
+    parser = argparse.ArgumentParser(description=f"Write the GPU Benchmark DB cache to {GPU_BENCHMARK_DB_CACHE_TEXT_FILE}")
+    parser.add_argument("--save-response", metavar="FILE", help=f"instead, save the raw response of {GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL} to FILE, e.g. tests/fixtures/gpu_mega_page_data.json")
+    parser.add_argument("--lookup", nargs="+", metavar="CARD_ID", help="instead, print the cached entries of these PassMark card ids, e.g. \"NVIDIA GeForce RTX 3060\"")
+    args = parser.parse_args()
+
+    if args.lookup != None:
+        gpu_benchmark_db = GPUBenchmarkDB()
+        for card_id in args.lookup:
+            gpu_entry = gpu_benchmark_db.get(card_id)
+            print(f"{card_id}: {gpu_entry if gpu_entry != None else 'not in the GPU Benchmark DB cache'}")
+    elif args.save_response != None:
+        with open(args.save_response, 'wb') as response_file:
+            response_file.write(GPUBenchmarkDB.fetch_mega_page_data())
+        print(f"Written {args.save_response}")
+    else:
+        gpu_benchmark_db = GPUBenchmarkDB()
+        gpu_benchmark_db.write_text()
     
@@ -0,0 +1,87 @@
+import contextlib
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+
+RUN_REPORT_FILE="output/run_report.json"
+PROFILE_FILE="output/profile.pstats"
+
+class Instrumentation:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.spans = dict()
+        self.counters = dict()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start_time)
+
+    def add_span(self, name, elapsed_time):
+        with self.lock:
+            span = self.spans.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            span["count"] += 1
+            span["total_seconds"] += elapsed_time
+            span["max_seconds"] = max(span["max_seconds"], elapsed_time)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        with self.lock:
+            return {
+                "start_time": self.start_time,
+                "wall_seconds": time.time() - self.start_time,
+                "argv": sys.argv,
+                "spans": {name: dict(span) for (name, span) in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def write_report(self, path=RUN_REPORT_FILE):
+        with open(path, 'wt') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        print(f"Run report written to {path}")
+
+INSTRUMENTATION = Instrumentation()
+
+def span(name):
+    return INSTRUMENTATION.span(name)
+
+def count(name, amount=1):
+    INSTRUMENTATION.count(name, amount)
+
+def timed(name):
+
+    # Decorator form of span(), for timing a whole function
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with INSTRUMENTATION.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def profile(enabled, path=PROFILE_FILE):
+
+    # Optional cProfile run around a block; the stats can be inspected with "python -m pstats"
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
@@ -0,0 +1,75 @@
+import bisect
+import csv
+from tabulate import tabulate
+
+from card_index import CardRequirements
+from instrumentation import timed
+
+MIN_SPEC_CURVE_FILE="output/min_spec_curve.csv"
+
+class MinSpecSolution:
+    def __init__(self, coverage_goal, requirements, card, market_share, curve):
+        self.coverage_goal = coverage_goal
+        self.requirements = requirements
+        self.card = card
+        self.market_share = market_share
+        self.curve = curve
+
+@timed("min_spec")
+def find_min_spec(card_index, coverage_goal, min_vram_bytes=None, min_tflops=None, memory_types=None):
+    requirements = CardRequirements(min_vram_bytes=min_vram_bytes, min_tflops=min_tflops, memory_types=memory_types)
+    return solve_min_spec(card_index.coverage_curve(requirements), coverage_goal, requirements)
+
+def solve_min_spec(curve, coverage_goal, requirements):
+
+    # The most demanding min spec GPU that still covers coverage_goal of the survey, given the other requirements
+    # Market share only grows as the minimum G3D mark goes down, so this is the first card on the coverage curve that reaches the goal
+    # card is None if no card reaches the goal, e.g. because the other requirements already exclude too many users
+    position = bisect.bisect_left(curve, coverage_goal, key=lambda curve_point: curve_point[1])
+    if position == len(curve):
+        return MinSpecSolution(coverage_goal, requirements, None, curve[-1][1] if len(curve) > 0 else 0.0, curve)
+
+    # Among cards with the same G3D mark, prefer one that is in the survey
+    card, market_share = curve[position]
+    for (equal_card, equal_market_share) in curve[position:]:
+        if equal_card.gpu_benchmark_db_entry.g3d_mark != card.gpu_benchmark_db_entry.g3d_mark:
+            break
+        if equal_card.steam_card != None:
+            card = equal_card
+            break
+    return MinSpecSolution(coverage_goal, requirements, card, market_share, curve)
+
+def write_min_spec_curve_csv(min_spec_solution, console_rows=None):
+
+    header = ["GPU Name", "G3D mark (performance metric)", "Popularity", "Market coverage"]
+    surveyed_lines = []
+    solution_position = None
+
+    with open(MIN_SPEC_CURVE_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        for card, market_share in min_spec_solution.curve:
+            popularity = card.steam_card.popularity if card.steam_card != None else None
+            line = [card.card_id, card.gpu_benchmark_db_entry.g3d_mark, f"{popularity * 100:.2f}%" if popularity != None else None, f"{market_share * 100:.2f}%"]
+            writer.writerow(line)
+            if card is min_spec_solution.card:
+                solution_position = len(surveyed_lines)
+            if popularity != None:
+                surveyed_lines.append(line)
+
+    print(f"Results written to {MIN_SPEC_CURVE_FILE}")
+
+    # The console only shows surveyed cards, around the solution if there is one
+    if console_rows != 0:
+        start = 0
+        if console_rows != None and solution_position != None:
+            start = max(solution_position - console_rows // 2, 0)
+        console_results = surveyed_lines[start:start + console_rows] if console_rows != None else surveyed_lines
+        print(tabulate(console_results, headers=header, tablefmt='fancy_grid'))
+
+def describe_min_spec(min_spec_solution):
+    if min_spec_solution.card == None:
+        return f"No card reaches {min_spec_solution.coverage_goal * 100:.2f}% coverage; at most {min_spec_solution.market_share * 100:.2f}% of users meet the requirements"
+    card = min_spec_solution.card
+    gpu_description = f" ({card.gpu_architecture_db_card.describe()})" if card.gpu_architecture_db_card != None else ""
+    return f"Min spec for {min_spec_solution.coverage_goal * 100:.2f}% coverage: {card.card_id}{gpu_description}, G3D mark {card.gpu_benchmark_db_entry.g3d_mark}, covers {min_spec_solution.market_share * 100:.2f}%"
@@ -0,0 +1,167 @@
+import csv
+import importlib.util
+import json
+from tabulate import tabulate
+
+from instrumentation import timed
+
+TARGET_CONFIGURATIONS_FILE="output/target_configurations.csv"
+ALL_CARDS_FILE="output/all_cards.csv"
+ALL_CARDS_JSONL_FILE="output/all_cards.jsonl"
+ALL_CARDS_PARQUET_FILE="output/all_cards.parquet"
+
+ALL_CARDS_PARQUET_BATCH_SIZE=4096
+
+OUTPUT_FORMATS=["csv", "jsonl", "parquet"]
+
+def print_table(header, rows, total_row_count, console_rows):
+
+    # Only the first console_rows rows are formatted; console_rows=None prints everything, 0 prints nothing
+    if console_rows == 0:
+        return
+    print(tabulate(rows, headers=header, tablefmt='fancy_grid'))
+    if total_row_count > len(rows):
+        print(f"... {total_row_count - len(rows)} more rows")
+
+def write_target_configurations_csv(target_configuration_db, cards, analyzed_cards, console_rows=None):
+
+    header = ["Configuration", "GPU Name", "GPU description", "Market coverage", "G3D mark (performance metric)"]
+    console_results = []
+    row_count = 0
+
+    with open(TARGET_CONFIGURATIONS_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+
+        for target_configuration_name, target_configuration in target_configuration_db.items():
+
+            card = cards.find(target_configuration.gpu_name)
+            if card != None:
+                analyzed_card = analyzed_cards.get(target_configuration.name)
+                market_share = f"{analyzed_card.market_share * 100:.2f}%" if analyzed_card != None else None
+                g3d_mark = card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else None
+                gpu_description = card.gpu_architecture_db_card.describe() if card.gpu_architecture_db_card != None else None
+                line = [target_configuration.name, target_configuration.gpu_name, gpu_description, market_share, g3d_mark]
+            else:
+                line = [target_configuration.name, target_configuration.gpu_name, None, None, None]
+
+            writer.writerow(line)
+            row_count += 1
+            if console_rows == None or len(console_results) < console_rows:
+                console_results.append(line)
+
+    print(f"Results written to {TARGET_CONFIGURATIONS_FILE}")
+
+    print_table(header, console_results, row_count, console_rows)
+
+def iter_all_cards_rows(target_configuration_db, cards, card_index, analyzed_cards):
+
+    # Rows in descending G3D mark order straight from the index, followed by cards without benchmark data
+    # Each row is (card, [included for each target configuration, by configuration name])
+    sorted_target_configuration_names = sorted(target_configuration_db.configs.keys())
+    sorted_analyzed_cards = [analyzed_cards.get(target_configuration_name) for target_configuration_name in sorted_target_configuration_names]
+
+    for card in card_index.descending_cards():
+        yield card, [analyzed_card != None and analyzed_card.includes(card) for analyzed_card in sorted_analyzed_cards]
+
+    for card in cards.values():
+        if card.gpu_benchmark_db_entry == None:
+            yield card, [False for analyzed_card in sorted_analyzed_cards]
+
+def describe_card(card):
+    g3d_mark = card.gpu_benchmark_db_entry.g3d_mark if card.gpu_benchmark_db_entry != None else None
+    gpu_description = card.gpu_architecture_db_card.describe() if card.gpu_architecture_db_card != None else None
+    popularity = card.steam_card.popularity if card.steam_card != None else None
+    return gpu_description, popularity, g3d_mark
+
+def write_all_cards_csv(target_configuration_db, cards, card_index, analyzed_cards, console_rows=None):
+
+    header = ["Configuration", "GPU Description", "Popularity", "G3D mark (performance metric)"] + sorted(target_configuration_db.configs.keys())
+    console_results = []
+    row_count = 0
+
+    with open(ALL_CARDS_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+
+        for card, included in iter_all_cards_rows(target_configuration_db, cards, card_index, analyzed_cards):
+            gpu_description, popularity, g3d_mark = describe_card(card)
+            line = [card.card_id, gpu_description, f"{popularity * 100:.2f}%" if popularity != None else None, g3d_mark] + ["Yes" if card_included else "No" for card_included in included]
+
+            writer.writerow(line)
+            row_count += 1
+            if console_rows == None or len(console_results) < console_rows:
+                console_results.append(line)
+
+    print(f"Results written to {ALL_CARDS_FILE}")
+
+    print_table(header, console_results, row_count, console_rows)
+
+def write_all_cards_jsonl(target_configuration_db, cards, card_index, analyzed_cards):
+
+    sorted_target_configuration_names = sorted(target_configuration_db.configs.keys())
+
+    with open(ALL_CARDS_JSONL_FILE, 'wt') as jsonl_file:
+        for card, included in iter_all_cards_rows(target_configuration_db, cards, card_index, analyzed_cards):
+            gpu_description, popularity, g3d_mark = describe_card(card)
+            jsonl_file.write(json.dumps({
+                "card": card.card_id,
+                "gpu_description": gpu_description,
+                "popularity": popularity,
+                "g3d_mark": g3d_mark,
+                "included": dict(zip(sorted_target_configuration_names, included)),
+            }))
+            jsonl_file.write("\n")
+
+    print(f"Results written to {ALL_CARDS_JSONL_FILE}")
+
+def write_all_cards_parquet(target_configuration_db, cards, card_index, analyzed_cards):
+
+    # pyarrow is only needed for this output format; callers check is_parquet_available() up front
+    import pyarrow
+    import pyarrow.parquet
+
+    sorted_target_configuration_names = sorted(target_configuration_db.configs.keys())
+    schema = pyarrow.schema([("card", pyarrow.string()), ("gpu_description", pyarrow.string()), ("popularity", pyarrow.float64()), ("g3d_mark", pyarrow.int64())]
+        + [(target_configuration_name, pyarrow.bool_()) for target_configuration_name in sorted_target_configuration_names])
+
+    def write_batch(parquet_writer, batch):
+        parquet_writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+
+    with pyarrow.parquet.ParquetWriter(ALL_CARDS_PARQUET_FILE, schema) as parquet_writer:
+        batch = []
+        for card, included in iter_all_cards_rows(target_configuration_db, cards, card_index, analyzed_cards):
+            gpu_description, popularity, g3d_mark = describe_card(card)
+            row = {"card": card.card_id, "gpu_description": gpu_description, "popularity": popularity, "g3d_mark": g3d_mark}
+            row.update(zip(sorted_target_configuration_names, included))
+            batch.append(row)
+            if len(batch) == ALL_CARDS_PARQUET_BATCH_SIZE:
+                write_batch(parquet_writer, batch)
+                batch = []
+        if len(batch) > 0:
+            write_batch(parquet_writer, batch)
+
+    print(f"Results written to {ALL_CARDS_PARQUET_FILE}")
+
+def is_parquet_available():
+    return importlib.util.find_spec("pyarrow") != None
+
+def output_files(output_formats):
+    files = [TARGET_CONFIGURATIONS_FILE]
+    if "csv" in output_formats:
+        files.append(ALL_CARDS_FILE)
+    if "jsonl" in output_formats:
+        files.append(ALL_CARDS_JSONL_FILE)
+    if "parquet" in output_formats:
+        files.append(ALL_CARDS_PARQUET_FILE)
+    return files
+
+@timed("output")
+def write_outputs(target_configuration_db, cards, card_index, analyzed_cards, output_formats, console_rows):
+    write_target_configurations_csv(target_configuration_db, cards, analyzed_cards, console_rows=None if console_rows != 0 else 0)
+    if "csv" in output_formats:
+        write_all_cards_csv(target_configuration_db, cards, card_index, analyzed_cards, console_rows=console_rows)
+    if "jsonl" in output_formats:
+        write_all_cards_jsonl(target_configuration_db, cards, card_index, analyzed_cards)
+    if "parquet" in output_formats:
+        write_all_cards_parquet(target_configuration_db, cards, card_index, analyzed_cards)
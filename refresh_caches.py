@@ -0,0 +1,52 @@
+import argparse
+import concurrent.futures
+import sys
+import time
+
+from gpu_architecture_db import GPU_ARCHITECTURE_DB_NEGATIVE_TTL_DAYS, GPU_ARCHITECTURE_DB_TTL_DAYS, GPUArchitectureDB
+from gpu_benchmark_db import GPU_BENCHMARK_DB_TTL_DAYS, GPUBenchmarkDB
+from steam_db import SteamSurveyIndex
+
+def refresh_steam_db():
+    SteamSurveyIndex().refresh()
+    return "checked"
+
+def refresh_gpu_benchmark_db(ttl_days, force):
+    return "refetched" if GPUBenchmarkDB(ttl_days=ttl_days).refresh(force=force) else "up to date"
+
+def refresh_gpu_architecture_db(ttl_days, negative_ttl_days, include_all_unknowns):
+    fetched_count, stale_count = GPUArchitectureDB(ttl_days=ttl_days, negative_ttl_days=negative_ttl_days).refresh(include_all_unknowns=include_all_unknowns)
+    return f"{fetched_count} of {stale_count} stale entries refetched"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refetch cache entries that are past their TTL, while analysis keeps reading the current caches")
+    parser.add_argument("--ttl-days", type=float, default=GPU_ARCHITECTURE_DB_TTL_DAYS, help="refetch GPU architecture DB cards older than this")
+    parser.add_argument("--negative-ttl-days", type=float, default=GPU_ARCHITECTURE_DB_NEGATIVE_TTL_DAYS, help="look up cards the GPU architecture DB didn't have again once older than this")
+    parser.add_argument("--all-unknowns", action="store_true", help="look up every card the GPU architecture DB didn't have again, whatever its age")
+    parser.add_argument("--benchmark-ttl-days", type=float, default=GPU_BENCHMARK_DB_TTL_DAYS, help="refetch the PassMark page if the GPU Benchmark DB cache is older than this")
+    parser.add_argument("--force", action="store_true", help="refetch everything, whatever its age")
+    args = parser.parse_args()
+
+    # Each source is refreshed on its own thread; each writes its new entries in one transaction,
+    #   so analysis runs and the analysis service keep using the previous entries until then
+    refreshes = {
+        "SteamDB": lambda: refresh_steam_db(),
+        "GPUBenchmarkDB": lambda: refresh_gpu_benchmark_db(args.benchmark_ttl_days, args.force),
+        "GPUArchitectureDB": lambda: refresh_gpu_architecture_db(0.0 if args.force else args.ttl_days, 0.0 if args.force else args.negative_ttl_days, args.force or args.all_unknowns),
+    }
+
+    start_time = time.perf_counter()
+    failed_count = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(refreshes)) as executor:
+        futures = {executor.submit(refresh): name for (name, refresh) in refreshes.items()}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                print(f"{name} refreshed: {future.result()}")
+            except Exception as e:
+                failed_count += 1
+                print(f"{name} refresh failed: {e!r}")
+
+    print(f"Caches refreshed in {time.perf_counter() - start_time:.2f}s")
+    if failed_count > 0:
+        sys.exit(1)
@@ -0,0 +1,242 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+SNAPSHOT_MAGIC=b"HWSNAPSH"
+SNAPSHOT_FORMAT_VERSION=2
+
+SNAPSHOT_COLUMN_TYPES={"str": str, "int": int, "float": float}
+SNAPSHOT_COLUMN_FORMATS={"str": "I", "int": "q", "float": "d"}
+SNAPSHOT_INT_RANGE=range(-2**63, 2**63)
+
+# File layout, little-endian:
+#   magic, format version, header length, then a JSON header with the column types and section offsets
+#   keys section: string number of each record's key
+#   present section: one byte per record, 0 for records without a value (e.g. cards known to be missing upstream)
+#   fetched_at section: the time each record was fetched, as stored next to it, NaN if unknown
+#   per column: one byte per record, 1 where the value is None, then the fixed-width values, string columns as string numbers
+#   hash section: open addressing table of record index + 1 (0 is an empty slot), by CRC-32 of the key
+#   string table: each distinct string once, as UTF-8 bytes, with the start offset of each string number plus the end offset of the last one
+SNAPSHOT_PREAMBLE=struct.Struct("<8sII")
+
+def snapshot_path(store_path):
+
+    # Snapshots live next to the store they are taken of
+    return f"{os.path.splitext(store_path)[0]}.snapshot"
+
+def hash_slot_count(record_count):
+
+    # Power of two, at most half full
+    slot_count = 1
+    while slot_count < record_count * 2:
+        slot_count *= 2
+    return slot_count
+
+def align(size):
+    return (size + 7) & ~7
+
+def write_snapshot(path, source_version, columns, records):
+
+    # columns is a list of (attribute name, "str" / "int" / "float")
+    # records is a list of (key, object with those attributes or None, fetch time), e.g. as read from a CacheStore
+    # Values must be None or exactly of their column's type, so that they read back the same; anything else raises ValueError
+    strings = dict()
+    string_offsets = [0]
+    string_data = bytearray()
+
+    def string_number(value):
+        number = strings.get(value)
+        if number == None:
+            number = len(strings)
+            string_data.extend(value.encode("utf-8"))
+            string_offsets.append(len(string_data))
+            strings[value] = number
+        return number
+
+    sections = dict()
+    sections["keys"] = struct.pack(f"<{len(records)}I", *[string_number(key) for (key, entry, fetched_at) in records])
+    sections["present"] = bytes(1 if entry != None else 0 for (key, entry, fetched_at) in records)
+    sections["fetched_at"] = struct.pack(f"<{len(records)}d", *[fetched_at if fetched_at != None else math.nan for (key, entry, fetched_at) in records])
+    for name, column_type in columns:
+        nulls = bytearray(len(records))
+        values = []
+        for index, (key, entry, fetched_at) in enumerate(records):
+            value = getattr(entry, name) if entry != None else None
+            if value == None:
+                nulls[index] = 1
+                values.append(0)
+            elif type(value) != SNAPSHOT_COLUMN_TYPES[column_type] or (column_type == "int" and not value in SNAPSHOT_INT_RANGE):
+                raise ValueError(f"{key}: {name} is {value!r}, which a {column_type} column can't hold")
+            else:
+                values.append(string_number(value) if column_type == "str" else value)
+        sections[f"nulls.{name}"] = bytes(nulls)
+        sections[f"column.{name}"] = struct.pack(f"<{len(records)}{SNAPSHOT_COLUMN_FORMATS[column_type]}", *values)
+
+    slot_count = hash_slot_count(len(records))
+    slots = [0] * slot_count
+    for index, (key, entry, fetched_at) in enumerate(records):
+        slot = zlib.crc32(key.encode("utf-8")) & (slot_count - 1)
+        while slots[slot] != 0:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = index + 1
+    sections["hash"] = struct.pack(f"<{slot_count}I", *slots)
+    sections["string_offsets"] = struct.pack(f"<{len(string_offsets)}I", *string_offsets)
+    sections["string_data"] = bytes(string_data)
+
+    # Section offsets depend on the header length, which depends on the offsets; room is reserved for the largest offsets first
+    header = {"source_version": source_version, "record_count": len(records), "string_count": len(strings), "columns": columns, "hash_slot_count": slot_count}
+    section_offsets = {name: 0xFFFFFFFFFFFF for name in sections.keys()}
+    header["sections"] = section_offsets
+    header["size"] = 0xFFFFFFFFFFFF
+    data_offset = align(SNAPSHOT_PREAMBLE.size + len(json.dumps(header).encode("utf-8")))
+    for name, section in sections.items():
+        section_offsets[name] = data_offset
+        header["size"] = data_offset + len(section)
+        data_offset = align(header["size"])
+    encoded_header = json.dumps(header).encode("utf-8")
+
+    # Each writer has a temporary file of its own, moved into place once complete, so readers only ever map a whole file,
+    #   and keep reading the file they mapped if another run replaces it meanwhile
+    snapshot_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False)
+    try:
+        with snapshot_file:
+            snapshot_file.write(SNAPSHOT_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(encoded_header)))
+            snapshot_file.write(encoded_header)
+            for name, section in sections.items():
+                snapshot_file.write(b"\0" * (section_offsets[name] - snapshot_file.tell()))
+                snapshot_file.write(section)
+        os.replace(snapshot_file.name, path)
+    except BaseException:
+        os.remove(snapshot_file.name)
+        raise
+
+class Snapshot:
+    def __init__(self, path, factory):
+
+        # Read-only lookups in a snapshot file, key -> factory(*column values), or None for records without a value
+        # Only the header is parsed up front; records are decoded from the mapped file when they are looked up
+        self.path = path
+        self.factory = factory
+        with open(path, 'rb') as snapshot_file:
+            self.mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, format_version, header_length = SNAPSHOT_PREAMBLE.unpack_from(self.mmap, 0)
+            if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {SNAPSHOT_FORMAT_VERSION} snapshot")
+            if sys.byteorder != "little":
+                raise ValueError(f"{path} is little-endian, and can only be mapped on little-endian machines")
+            header = json.loads(self.mmap[SNAPSHOT_PREAMBLE.size:SNAPSHOT_PREAMBLE.size + header_length].decode("utf-8"))
+            if header["size"] != len(self.mmap):
+                raise ValueError(f"{path} is {len(self.mmap)} bytes long instead of {header['size']}")
+        except BaseException:
+            self.mmap.close()
+            raise
+
+        self.source_version = header["source_version"]
+        self.record_count = header["record_count"]
+        self.hash_slot_count = header["hash_slot_count"]
+
+        # Typed views straight onto the mapped sections, so reading a value is a single index operation
+        self.views = []
+
+        def section_view(name, view_format, count):
+            offset = header["sections"][name]
+            view = memoryview(self.mmap)[offset:offset + count * struct.calcsize(view_format)].cast(view_format)
+            self.views.append(view)
+            return view
+
+        self.key_numbers = section_view("keys", "I", self.record_count)
+        self.present_flags = section_view("present", "B", self.record_count)
+        self.fetch_times = section_view("fetched_at", "d", self.record_count)
+        self.hash_slots = section_view("hash", "I", self.hash_slot_count)
+        self.string_offsets = section_view("string_offsets", "I", header["string_count"] + 1)
+        self.string_data = section_view("string_data", "B", self.string_offsets[-1])
+        self.columns = [(column_type, section_view(f"nulls.{name}", "B", self.record_count), section_view(f"column.{name}", SNAPSHOT_COLUMN_FORMATS[column_type], self.record_count))
+            for (name, column_type) in header["columns"]]
+        self.strings = dict()
+        self.decoded = dict()
+
+    @staticmethod
+    def open(path, source_version, factory):
+
+        # Returns None if there is no readable snapshot of this version of the source, so the caller can fall back to the source itself
+        if not os.path.exists(path):
+            return None
+        try:
+            snapshot = Snapshot(path, factory)
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            print(f"Unable to read snapshot {path}: {e}")
+            return None
+        if snapshot.source_version != source_version:
+            snapshot.close()
+            return None
+        return snapshot
+
+    def string_bytes(self, number):
+        return self.string_data[self.string_offsets[number]:self.string_offsets[number + 1]]
+
+    def string(self, number):
+
+        # Decoded once per distinct string, so repeated values (memory types, vendors, ...) share one str
+        string = self.strings.get(number)
+        if string == None:
+            string = str(self.string_bytes(number), "utf-8")
+            self.strings[number] = string
+        return string
+
+    def find(self, key):
+        encoded_key = key.encode("utf-8")
+        mask = self.hash_slot_count - 1
+        slot = zlib.crc32(encoded_key) & mask
+        while True:
+            record = self.hash_slots[slot]
+            if record == 0:
+                return None
+            if self.string_bytes(self.key_numbers[record - 1]) == encoded_key:
+                return record - 1
+            slot = (slot + 1) & mask
+
+    def decode(self, index):
+        if self.present_flags[index] == 0:
+            return None
+        values = []
+        for (column_type, nulls, column) in self.columns:
+            if nulls[index] != 0:
+                values.append(None)
+            elif column_type == "str":
+                values.append(self.string(column[index]))
+            else:
+                values.append(column[index])
+        return self.factory(*values)
+
+    def lookup(self, key):
+
+        # Returns (found, value, fetch time); records are decoded once
+        decoded = self.decoded.get(key)
+        if decoded == None:
+            index = self.find(key)
+            if index == None:
+                return False, None, None
+            decoded = (True, self.decode(index), self.fetch_times[index])
+            self.decoded[key] = decoded
+        return decoded
+
+    def fetched_before(self, cutoff_time):
+
+        # Records fetched before cutoff_time, as (key, whether it has a value), without decoding them
+        return [(self.string(self.key_numbers[index]), self.present_flags[index] != 0) for index in range(self.record_count) if self.fetch_times[index] < cutoff_time]
+
+    def __len__(self):
+        return self.record_count
+
+    def close(self):
+        self.decoded = dict()
+        for view in self.views:
+            view.release()
+        self.mmap.close()
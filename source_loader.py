@@ -0,0 +1,35 @@
+import concurrent.futures
+import time
+
+from instrumentation import span
+
+def load_sources(sources):
+
+    # Initialize every source on its own thread, since each is dominated by network or disk I/O
+    # Returns source name -> instance, with None for sources that failed to initialize
+    results = dict()
+    start_time = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+        futures = dict()
+        for name, factory in sources:
+            print(f"Initializing {name}")
+            futures[executor.submit(timed_call, name, factory)] = name
+
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                results[name], elapsed_time = future.result()
+                print(f"{name} up in {elapsed_time:.2f}s")
+            except Exception as e:
+                results[name] = None
+                print(f"{name} failed: {e!r}")
+
+    print(f"Sources loaded in {time.perf_counter() - start_time:.2f}s")
+    return results
+
+def timed_call(name, factory):
+    start_time = time.perf_counter()
+    with span(f"load_source.{name}"):
+        result = factory()
+    return result, time.perf_counter() - start_time
@@ -1,31 +1,49 @@
 import csv
-import io
+import os
 import requests
+import tempfile
+
+from cache_store import CacheStore
+from instrumentation import timed
 
 STEAM_DB_CSV_URL="https://raw.githubusercontent.com/jdegene/steamHWsurvey/refs/heads/master/shs.csv"
 STEAM_DB_DESIRED_DATE="2025-08-01"
+STEAM_DB_VIDEO_CARD_CATEGORY="Video Card Description"
+STEAM_DB_CPU_CORES_CATEGORY="Physical CPUs"
+STEAM_DB_SYSTEM_RAM_CATEGORY="System RAM"
+STEAM_DB_OS_CATEGORY="OS Version"
 
+STEAM_DB_CSV_FILE="cache/steam_db_shs.csv"
+STEAM_DB_INDEX_FILE="cache/steam_db_index.sqlite"
 STEAM_DB_TEXT_FILE="cache/steam_db.txt"
 
+STEAM_DB_DOWNLOAD_CHUNK_SIZE=1024 * 1024
+
 class SteamDB:
-    def __init__(self):
+    def __init__(self, date=STEAM_DB_DESIRED_DATE):
 
+        self.date = date
         self.cards = dict()
-        video_card_description = "Video Card Description"
 
-        get_csv_request = requests.get(STEAM_DB_CSV_URL)
-        if get_csv_request.status_code != 200:
-            print(f"Error while fetching file {STEAM_DB_CSV_URL}, status code {get_csv_request.status_code}")
-            raise Exception(f"Error fetching {STEAM_DB_CSV_URL}")
+        # Share of the survey taken out by remove(), e.g. the "Other" category
+        self.removed_popularity = 0.0
 
-        reader = csv.reader(io.StringIO(get_csv_request.text, newline=''), delimiter=',', quotechar='"')
-        for row in reader:
-            if (row[0] == STEAM_DB_DESIRED_DATE) and (row[1] == video_card_description) and (row[2] != ""):
-                name = row[2]
-                popularity=float(row[4])
-                self.cards[name]=SteamHWSurveyVideoCard(name=name, popularity=popularity)
+        self.survey_index = SteamSurveyIndex()
+        self.survey_index.refresh()
 
-        print(f"Read Steam DB, {len(self.cards)} entries")
+        for name, popularity in self.survey_index.get(date, STEAM_DB_VIDEO_CARD_CATEGORY):
+            self.cards[name]=SteamHWSurveyVideoCard(name=name, popularity=popularity)
+
+        # Every other category of the same survey (CPUs, RAM, OS, ...), as category -> [(name, popularity)]
+        # The index is built from all categories in the same pass over the CSV, so these are single lookups
+        self.categories = dict()
+        for category in self.survey_index.categories():
+            if category != STEAM_DB_VIDEO_CARD_CATEGORY:
+                rows = self.survey_index.get(date, category)
+                if len(rows) > 0:
+                    self.categories[category] = rows
+
+        print(f"Read Steam DB, {len(self.cards)} entries & {len(self.categories)} other categories")
 
         self.write_text()
 
@@ -35,11 +53,19 @@ class SteamDB:
     def remove(self, card_id):
         card_to_remove = self.cards.get(card_id)
         if card_to_remove == None:
-            raise f"Card {card_id} does not exist in steam DB"
+            raise Exception(f"Card {card_id} does not exist in steam DB")
 
         del self.cards[card_id]
         for card_id, card in self.cards.items():
             card.popularity = card.popularity * (1.0 / (1.0 - card_to_remove.popularity))
+        self.removed_popularity = 1.0 - (1.0 - self.removed_popularity) * (1.0 - card_to_remove.popularity)
+
+    def include(self, names):
+
+        # Cards surveyed in other months, added with no popularity in this one, so they are joined like every other card
+        for name in names:
+            if not name in self.cards and name != "Other":
+                self.cards[name] = SteamHWSurveyVideoCard(name=name, popularity=0.0)
 
     def write_text(self):
 
@@ -51,11 +77,117 @@ class SteamDB:
     def iter(self):
         return self.cards.values()
 
+    def category(self, category):
+        return self.categories.get(category, [])
+
+class SteamSurveyIndex:
+    def __init__(self):
+        self.store = CacheStore(STEAM_DB_INDEX_FILE)
+
+    @timed("steam_db.fetch")
+    def refresh(self):
+
+        # Revalidate the local copy of the survey CSV with a conditional GET
+        # The CSV is only re-parsed when the server returns a new version of it, or when the index wasn't built from the local copy,
+        #   e.g. after a run stopped between replacing the CSV and indexing it; the ETag then doesn't describe the local copy, so the GET is unconditional
+        found, source = self.store.get("source")
+        is_index_current = found and os.path.exists(STEAM_DB_CSV_FILE) and source.get("csv_mtime_ns") == os.stat(STEAM_DB_CSV_FILE).st_mtime_ns
+        headers = dict()
+        if is_index_current:
+            if source.get("etag") != None:
+                headers["If-None-Match"] = source["etag"]
+            if source.get("last_modified") != None:
+                headers["If-Modified-Since"] = source["last_modified"]
+
+        try:
+            with requests.get(STEAM_DB_CSV_URL, headers=headers, stream=True) as get_csv_request:
+                if get_csv_request.status_code == 304:
+                    print("Steam DB CSV is up to date")
+                    return
+                if get_csv_request.status_code != 200:
+                    print(f"Error while fetching file {STEAM_DB_CSV_URL}, status code {get_csv_request.status_code}")
+                    raise Exception(f"Error fetching {STEAM_DB_CSV_URL}")
+
+                # Each download goes to a temporary file of its own, next to the CSV, so refreshes running at the same time
+                #   (make refresh, analyze.py, the service reload) never write into the same file; the last one to finish replaces the CSV
+                csv_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(STEAM_DB_CSV_FILE), prefix="steam_db_shs.", suffix=".csv.tmp", delete=False)
+                try:
+                    with csv_file:
+                        for chunk in get_csv_request.iter_content(chunk_size=STEAM_DB_DOWNLOAD_CHUNK_SIZE):
+                            csv_file.write(chunk)
+                    os.replace(csv_file.name, STEAM_DB_CSV_FILE)
+                except BaseException:
+                    os.remove(csv_file.name)
+                    raise
+
+                source = {"etag": get_csv_request.headers.get("ETag"), "last_modified": get_csv_request.headers.get("Last-Modified")}
+
+        except Exception as e:
+            if not os.path.exists(STEAM_DB_CSV_FILE):
+                raise
+            print(f"Unable to revalidate {STEAM_DB_CSV_URL} ({e}), using the local copy")
+            if is_index_current:
+                return
+            source = {"etag": None, "last_modified": None}
+
+        self.build(source)
+
+    @timed("steam_db.build_index")
+    def build(self, source):
+
+        # Single streaming pass over the CSV, grouping rows by survey date and category
+        # Columns are: date, category, name, change, percentage
+        rows = dict()
+        csv_mtime_ns = os.stat(STEAM_DB_CSV_FILE).st_mtime_ns
+        with open(STEAM_DB_CSV_FILE, 'rt', newline='') as csv_file:
+            reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+            for row in reader:
+                if len(row) < 5 or row[2] == "":
+                    continue
+                try:
+                    popularity = float(row[4])
+                except ValueError:
+                    continue
+                rows.setdefault((row[0], row[1]), []).append((row[2], popularity))
+
+        dates = sorted(set(date for (date, category) in rows.keys()))
+        categories = sorted(set(category for (date, category) in rows.keys()))
+
+        entries = {SteamSurveyIndex.key(date, category): date_category_rows for ((date, category), date_category_rows) in rows.items()}
+        entries["dates"] = dates
+        entries["categories"] = categories
+        # The modification time of the CSV the index was built from, to tell whether it still matches the local copy
+        entries["source"] = dict(source, csv_mtime_ns=csv_mtime_ns)
+        self.store.replace_all(entries)
+
+        print(f"Indexed Steam DB CSV, {len(dates)} dates & {len(categories)} categories")
+
+    def get(self, date, category):
+        found, rows = self.store.get(SteamSurveyIndex.key(date, category))
+        return rows if found else []
+
+    def dates(self):
+        found, dates = self.store.get("dates")
+        return dates if found else []
+
+    def categories(self):
+        found, categories = self.store.get("categories")
+        return categories if found else []
+
+    @staticmethod
+    def key(date, category):
+        return f"{date}/{category}"
+
 class SteamHWSurveyVideoCard:
+    __slots__ = ("name", "popularity")
+
     def __init__(self, name, popularity):
         self.name = name
         self.popularity = popularity
 
+    def __reduce__(self):
+        return (SteamHWSurveyVideoCard, (self.name, self.popularity))
+
     def __str__(self):
         return f"{self.name}, {self.popularity}"
 
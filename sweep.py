@@ -0,0 +1,262 @@
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import numpy
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+from analyze import create_cards, get_card_requirements
+from card_table import CardTable, eligibility
+from gpu_architecture_db import GPUArchitectureDB
+from gpu_benchmark_db import GPUBenchmarkDB
+from instrumentation import INSTRUMENTATION, count, span, timed
+from source_loader import load_sources
+from steam_db import STEAM_DB_VIDEO_CARD_CATEGORY, SteamDB
+from target_configuration_db import TargetConfiguration
+
+SWEEP_FILE="output/sweep.csv"
+SWEEP_SHARD_SIZE=1000
+
+# Shards submitted to the process pool ahead of the one being written, per worker
+SWEEP_PENDING_SHARDS_PER_WORKER=2
+
+class SharedColumns:
+    def __init__(self, block, layout):
+
+        # Read-only numpy views onto one shared memory block, laid out as [(name, dtype, shape, offset)]
+        self.block = block
+        self.layout = layout
+        self.columns = dict()
+        for (name, dtype, shape, offset) in layout:
+            column = numpy.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+            column.flags.writeable = False
+            self.columns[name] = column
+
+    @staticmethod
+    def create(columns):
+
+        # Copies the columns into a new block once; workers then map the same pages instead of each receiving a pickled copy
+        layout = []
+        size = 0
+        for name, column in columns.items():
+            layout.append((name, column.dtype.str, column.shape, size))
+            size = (size + column.nbytes + 7) & ~7
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, offset) in layout:
+            numpy.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)[...] = columns[name]
+        return SharedColumns(block, layout)
+
+    @staticmethod
+    def attach(block_name, layout):
+        return SharedColumns(shared_memory.SharedMemory(name=block_name), layout)
+
+    def close(self):
+
+        # The views must go before the block can be closed
+        self.columns = dict()
+        self.block.close()
+
+    def unlink(self):
+        self.block.unlink()
+
+# Columns of the process running shards, set once per worker process
+sweep_columns = None
+
+def use_shared_columns(shared_columns):
+    global sweep_columns
+    sweep_columns = shared_columns
+
+def attach_shared_columns(block_name, layout):
+    use_shared_columns(SharedColumns.attach(block_name, layout))
+
+def sweep_shard(shard):
+
+    # Market share of each target in the shard, in the survey month of that target
+    (min_g3d_marks, min_vram_bytes, min_tflops, allowed_memory_types, date_positions) = shard
+    columns = sweep_columns.columns
+    eligible = eligibility(columns["g3d_mark"], columns["vram_bytes"], columns["tflops"], columns["memory_type"], min_g3d_marks, min_vram_bytes, min_tflops, allowed_memory_types)
+
+    market_shares = numpy.zeros(len(min_g3d_marks))
+    for date_position in numpy.unique(date_positions):
+        rows = date_positions == date_position
+        market_shares[rows] = eligible[rows] @ columns["popularity"][date_position]
+    return market_shares
+
+def read_grid(path):
+
+    # Either a map of name -> spec like input/target_configurations.json, or JSON Lines with one spec per line plus its "name",
+    #   and optionally the survey month to analyze it in as "date"
+    # Yields (target configuration, date or None)
+    with open(path, 'rt') as grid_file:
+        if path.endswith(".jsonl"):
+            for line in grid_file:
+                if line.strip() != "":
+                    spec = json.loads(line)
+                    yield TargetConfiguration.from_spec(spec["name"], spec), spec.get("date")
+        else:
+            for name, spec in json.load(grid_file).items():
+                yield TargetConfiguration.from_spec(name, spec), None
+
+def generate_grid(cards, vram_floors_gb, dates):
+
+    # Every card with benchmark data crossed with every VRAM floor (0 for none) and every survey month
+    for card_id, card in cards.items():
+        if card.gpu_benchmark_db_entry == None:
+            continue
+        for vram_floor_gb in vram_floors_gb:
+            for date in dates:
+                name = card_id
+                if vram_floor_gb > 0:
+                    name += f" / VRAM >= {vram_floor_gb:g} GB"
+                if len(dates) > 1:
+                    name += f" / {date}"
+                yield TargetConfiguration(name, card_id, min_vram_bytes=int(vram_floor_gb * 1024 * 1024 * 1024) if vram_floor_gb > 0 else None), date
+
+def survey_popularity(survey_index, dates, card_table):
+
+    # Date x card popularity over the card table's columns
+    # Like SteamDB.remove(), the "Other" category is dropped and the remaining cards renormalized, month by month
+    popularity = numpy.zeros((len(dates), len(card_table)))
+    for date_position, date in enumerate(dates):
+        rows = survey_index.get(date, STEAM_DB_VIDEO_CARD_CATEGORY)
+        if len(rows) == 0:
+            raise Exception(f"No Steam survey for {date}")
+        other_popularity = sum(card_popularity for (name, card_popularity) in rows if name == "Other")
+        scale = 1.0 / (1.0 - other_popularity) if other_popularity < 1.0 else 1.0
+        for name, card_popularity in rows:
+            if name != "Other":
+                popularity[date_position, card_table.positions[name]] = card_popularity * scale
+    return popularity
+
+def create_shards(grid, cards, card_table, date_positions, shard_size):
+
+    # Turns targets into threshold arrays, shard_size targets at a time
+    # Yields (names, dates, shard); targets whose GPU can't be found or has no benchmark data are skipped and counted
+    names, dates, requirements_list = [], [], []
+
+    def make_shard():
+        return names, dates, card_table.thresholds(requirements_list) + (numpy.array([date_positions[date] for date in dates], dtype=numpy.int64),)
+
+    for target_configuration, date in grid:
+        try:
+            requirements = get_card_requirements(target_configuration, cards)
+        except Exception:
+            count("sweep.skipped_targets")
+            continue
+        names.append(target_configuration.name)
+        dates.append(date)
+        requirements_list.append(requirements)
+        if len(names) == shard_size:
+            yield make_shard()
+            names, dates, requirements_list = [], [], []
+
+    if len(names) > 0:
+        yield make_shard()
+
+def sweep_results(shards, executor, pending_shard_count):
+
+    # Yields (names, dates, market shares) for each shard, in order
+    # Shards are pulled from the generator only as results are taken, keeping at most pending_shard_count of them submitted at once,
+    #   so a huge grid is never materialized; later shards keep running while the oldest one is waited for
+    pending = collections.deque()
+    for (names, dates, shard) in shards:
+        pending.append((names, dates, executor.submit(sweep_shard, shard)))
+        if len(pending) >= pending_shard_count:
+            (names, dates, future) = pending.popleft()
+            yield names, dates, future.result()
+    while len(pending) > 0:
+        (names, dates, future) = pending.popleft()
+        yield names, dates, future.result()
+
+@timed("sweep")
+def run_sweep(grid, cards, card_table, popularity, date_positions, shard_size=SWEEP_SHARD_SIZE, workers=1):
+
+    # Shards run on a process pool, with the card columns and popularity shared through one shared memory block
+    # Shards are written as they finish, in grid order, so the output grows while the sweep runs and memory stays at a few shards
+    shared_columns = SharedColumns.create({"g3d_mark": card_table.g3d_mark, "vram_bytes": card_table.vram_bytes, "tflops": card_table.tflops,
+        "memory_type": card_table.memory_type, "popularity": popularity})
+    start_time = time.perf_counter()
+    target_count = 0
+    try:
+        with open(SWEEP_FILE, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(["Configuration", "Date", "Market coverage"])
+
+            shards = create_shards(grid, cards, card_table, date_positions, shard_size)
+            if workers > 1:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_columns, initargs=(shared_columns.block.name, shared_columns.layout))
+                results = sweep_results(shards, executor, workers * SWEEP_PENDING_SHARDS_PER_WORKER)
+            else:
+                executor = None
+                use_shared_columns(shared_columns)
+                results = ((names, dates, sweep_shard(shard)) for (names, dates, shard) in shards)
+
+            try:
+                for shard_position, (names, dates, market_shares) in enumerate(results):
+                    writer.writerows([name, date, f"{market_share * 100:.2f}%"] for (name, date, market_share) in zip(names, dates, market_shares))
+                    csvfile.flush()
+                    target_count += len(names)
+                    print(f"Shard {shard_position + 1} written, {target_count} targets in {time.perf_counter() - start_time:.2f}s")
+            finally:
+                if executor != None:
+                    executor.shutdown(cancel_futures=True)
+    finally:
+        use_shared_columns(None)
+        shared_columns.close()
+        shared_columns.unlink()
+
+    count("sweep.targets", target_count)
+    print(f"Swept {target_count} target configurations, results written to {SWEEP_FILE}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute the market coverage of a large grid of target configurations on a process pool")
+    parser.add_argument("--grid", help="target configurations to sweep: a JSON map like input/target_configurations.json, or JSON Lines with a \"name\" and optionally a \"date\" per spec")
+    parser.add_argument("--generate", action="store_true", help="sweep every card with benchmark data, crossed with --vram-gb and --dates, instead of a grid file")
+    parser.add_argument("--vram-gb", type=float, nargs="+", default=[0], help="VRAM floors for --generate, 0 for no floor")
+    parser.add_argument("--dates", nargs="+", help="survey months for --generate, or \"all\"; defaults to the month SteamDB analyzes")
+    parser.add_argument("--shard-size", type=int, default=SWEEP_SHARD_SIZE, help="number of target configurations per shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes to run shards on")
+    args = parser.parse_args()
+
+    if (args.grid == None) == (not args.generate):
+        print("Either --grid or --generate is required")
+        sys.exit(1)
+
+    loaded_sources = load_sources([("SteamDB", SteamDB), ("GPUBenchmarkDB", GPUBenchmarkDB), ("GPUArchitectureDB", GPUArchitectureDB)])
+    failed_sources = [name for (name, source) in loaded_sources.items() if source == None and name != "GPUArchitectureDB"]
+    if len(failed_sources) > 0:
+        print(f"Unable to sweep without {', '.join(failed_sources)}")
+        sys.exit(1)
+    steam_db = loaded_sources["SteamDB"]
+    gpu_db = loaded_sources.get("GPUArchitectureDB")
+    gpu_benchmark_db = loaded_sources["GPUBenchmarkDB"]
+
+    # Grid files are read up front, since the survey months they use decide which cards get joined
+    if args.grid != None:
+        grid = [(target_configuration, date if date != None else steam_db.date) for (target_configuration, date) in read_grid(args.grid)]
+        dates = list(dict.fromkeys(date for (target_configuration, date) in grid))
+    elif args.dates == ["all"]:
+        dates = steam_db.survey_index.dates()
+    else:
+        dates = args.dates if args.dates != None else [steam_db.date]
+
+    # Cards surveyed in any of the months are joined, so each month's popularity lines up with the same card columns
+    steam_db.remove("Other")
+    for date in dates:
+        steam_db.include(name for (name, popularity) in steam_db.survey_index.get(date, STEAM_DB_VIDEO_CARD_CATEGORY))
+    cards = create_cards(steam_db, gpu_db, gpu_benchmark_db)
+    with span("card_table"):
+        card_table = CardTable(cards)
+    popularity = survey_popularity(steam_db.survey_index, dates, card_table)
+    date_positions = {date: position for (position, date) in enumerate(dates)}
+
+    if args.generate:
+        grid = generate_grid(cards, args.vram_gb, dates)
+
+    run_sweep(grid, cards, card_table, popularity, date_positions, shard_size=args.shard_size, workers=args.workers)
+    print(f"{INSTRUMENTATION.report()['counters'].get('sweep.skipped_targets', 0)} target configurations skipped")
+    INSTRUMENTATION.write_report()
@@ -12,16 +12,58 @@ class TargetConfigurationDB:
             target_configurations = json.load(target_configurations_file)
             results = dict()
             for config_spec_name, config_spec in target_configurations.items():
-                results[config_spec_name] = TargetConfiguration(config_spec_name, config_spec)
+                results[config_spec_name] = TargetConfiguration.from_spec(config_spec_name, config_spec)
             return results
 
     def items(self):
         return self.configs.items()
 
 class TargetConfiguration:
-    def __init__(self, name, gpu_name):
+    def __init__(self, name, gpu_name, min_vram_bytes=None, min_tflops=None, memory_types=None, min_cpu_cores=None, min_ram_gb=None, operating_systems=None):
         self.name = name
         self.gpu_name = gpu_name
-        
+        self.min_vram_bytes = min_vram_bytes
+        self.min_tflops = min_tflops
+        self.memory_types = memory_types
+
+        # Requirements on the rest of the machine, checked against the other Steam survey categories
+        self.min_cpu_cores = min_cpu_cores
+        self.min_ram_gb = min_ram_gb
+        self.operating_systems = operating_systems
+
+    def has_component_requirements(self):
+        return self.min_cpu_cores != None or self.min_ram_gb != None or self.operating_systems != None
+
+    @staticmethod
+    def from_spec(name, config_spec):
+
+        # A spec is either just a GPU name, or an object with a GPU name plus additional minimum requirements:
+        #   { "gpu": "NVIDIA GeForce GTX 1060", "min_vram_gb": 4, "min_tflops": 3.5, "memory_types": ["GDDR5", "GDDR6"],
+        #     "min_cpu_cores": 4, "min_ram_gb": 8, "os": ["Windows 10", "Windows 11"] }
+        if isinstance(config_spec, str):
+            return TargetConfiguration(name, config_spec)
+
+        min_vram_gb = config_spec.get("min_vram_gb")
+        return TargetConfiguration(name, config_spec["gpu"],
+            min_vram_bytes=int(min_vram_gb * 1024 * 1024 * 1024) if min_vram_gb != None else None,
+            min_tflops=config_spec.get("min_tflops"),
+            memory_types=config_spec.get("memory_types"),
+            min_cpu_cores=config_spec.get("min_cpu_cores"),
+            min_ram_gb=config_spec.get("min_ram_gb"),
+            operating_systems=config_spec.get("os"))
+
     def __str__(self):
-        return f"{self.name} - {self.gpu_name}"
\ No newline at end of file
+        requirements = ""
+        if self.min_vram_bytes != None:
+            requirements += f", VRAM >= {round(self.min_vram_bytes / (1024 * 1024 * 1024), 2)} GB"
+        if self.min_tflops != None:
+            requirements += f", >= {self.min_tflops} SP TFLOPs"
+        if self.memory_types != None:
+            requirements += f", memory type in {self.memory_types}"
+        if self.min_cpu_cores != None:
+            requirements += f", >= {self.min_cpu_cores} CPU cores"
+        if self.min_ram_gb != None:
+            requirements += f", RAM >= {self.min_ram_gb} GB"
+        if self.operating_systems != None:
+            requirements += f", OS in {self.operating_systems}"
+        return f"{self.name} - {self.gpu_name}{requirements}"
\ No newline at end of file
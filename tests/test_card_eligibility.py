@@ -0,0 +1,67 @@
+import random
+
+import numpy
+import pytest
+
+import card_table
+from analyze import Card, Cards
+from card_index import CardIndex, CardRequirements
+from card_table import CardTable
+from gpu_architecture_db import GPUArchitectureDBEntry
+from gpu_benchmark_db import GPUBenchmarkDBEntry
+from steam_db import SteamHWSurveyVideoCard
+
+# Few distinct values, so that thresholds often land exactly on card values and many cards tie
+G3D_MARKS=[1000, 2500, 4000, 6000, 9000, 12000, 20000]
+VRAM_GB=[2, 4, 6, 8, 12, 16]
+TFLOPS=[1.0, 2.5, 5.0, 10.0, 20.0]
+MEMORY_TYPES=["GDDR5", "GDDR6", "GDDR6X", "HBM2"]
+
+def random_cards(generator, card_count):
+
+    # Cards with and without benchmark data, architecture data and survey popularity, in every combination
+    cards = Cards()
+    for index in range(card_count):
+        card_id = f"Card {index}"
+        gpu_benchmark_db_entry = GPUBenchmarkDBEntry(card_id, generator.choice(G3D_MARKS), 100) if generator.random() < 0.9 else None
+        gpu_architecture_db_card = None
+        if generator.random() < 0.8:
+            gpu_architecture_db_card = GPUArchitectureDBEntry(name=card_id, compute_unit_count=32, alu_count=2048,
+                single_precision_performance_tflops=generator.choice(TFLOPS), base_frequency_hz=1500000000, turbo_frequency_hz=None,
+                memory_bus_width_bits=256, memory_frequency_hz=1750000000.0, memory_size_bytes=generator.choice(VRAM_GB) * 1024 * 1024 * 1024,
+                memory_type=generator.choice(MEMORY_TYPES), release_date="2020-01-01", vendor="NVIDIA", asic_name="GA104")
+        steam_card = SteamHWSurveyVideoCard(card_id, generator.random() / card_count) if generator.random() < 0.6 else None
+        cards[card_id] = Card(card_id=card_id, steam_card=steam_card, gpu_architecture_db_card=gpu_architecture_db_card, gpu_benchmark_db_entry=gpu_benchmark_db_entry)
+    return cards
+
+def random_requirements(generator):
+
+    # Thresholds on and between card values, unknown memory types, and no requirement at all
+    min_vram_gb = generator.choice([None, None] + VRAM_GB + [3])
+    return CardRequirements(min_g3d_mark=generator.choice([None] + G3D_MARKS + [5000]),
+        min_vram_bytes=min_vram_gb * 1024 * 1024 * 1024 if min_vram_gb != None else None,
+        min_tflops=generator.choice([None, None] + TFLOPS + [7.5]),
+        memory_types=generator.choice([None, None, MEMORY_TYPES[:2], MEMORY_TYPES[2:], ["GDDR6"], ["GDDR7"]]))
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_card_index_and_card_table_agree_with_requirements(seed, monkeypatch):
+
+    # Small chunks, so that market shares are summed over many chunks of targets
+    monkeypatch.setattr(card_table, "CARD_TABLE_CHUNK_CELLS", 1000)
+
+    generator = random.Random(seed)
+    cards = random_cards(generator, 300)
+    requirements_list = [random_requirements(generator) for index in range(200)]
+    card_index = CardIndex(cards)
+    table = CardTable(cards)
+
+    eligibility = table.eligibility(requirements_list)
+    market_shares = table.market_shares(requirements_list)
+    for position, requirements in enumerate(requirements_list):
+        expected_card_ids = sorted(card.card_id for card in cards.values() if requirements.matches(card))
+        expected_market_share = sum(card.steam_card.popularity for card in cards.values() if card.steam_card != None and requirements.matches(card))
+
+        assert sorted(card.card_id for card in card_index.query(requirements)) == expected_card_ids
+        assert sorted(table.card_ids[card_position] for card_position in numpy.flatnonzero(eligibility[position])) == expected_card_ids
+        assert card_index.query_market_share(requirements) == pytest.approx(expected_market_share, abs=1e-12)
+        assert market_shares[position] == pytest.approx(expected_market_share, abs=1e-12)
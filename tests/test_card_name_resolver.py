@@ -0,0 +1,48 @@
+import pytest
+
+from card_name_resolver import CardNameResolver, architecture_id_from_name, architecture_name_from_id
+
+@pytest.mark.parametrize("name, card_id", [
+    ("RX 6600", "AMD Radeon RX 6600"),
+    ("GTX 1060", "NVIDIA GeForce GTX 1060"),
+    ("RTX 4070 Super", "NVIDIA GeForce RTX 4070 SUPER"),
+    ("RTX 2070 (Reference)", "NVIDIA GeForce RTX 2070"),
+    ("Arc A770", "Arc A770"),
+])
+def test_architecture_id_from_name(name, card_id):
+    assert architecture_id_from_name(name) == card_id
+
+def test_architecture_names_round_trip():
+    for card_id in ["AMD Radeon RX 6600", "NVIDIA GeForce GTX 1060", "NVIDIA GeForce RTX 4070 SUPER", "NVIDIA GeForce RTX 2080 Ti"]:
+        assert architecture_id_from_name(architecture_name_from_id(card_id)) == card_id
+
+@pytest.fixture
+def resolver_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cache").mkdir()
+
+def test_resolve_matches_architecture_names_by_tokens(resolver_directory):
+
+    # "AMD Radeon(TM) RX 6600" doesn't map to an architecture name directly, only through the name's tokens
+    card_name_resolver = CardNameResolver(["Radeon RX 6600", "GeForce GTX 1060"], ["RX 6600", "GTX 1060"])
+    assert card_name_resolver.resolve("AMD Radeon(TM) RX 6600") == ("Radeon RX 6600", "RX 6600")
+    assert card_name_resolver.resolve("NVIDIA GeForce GTX 1060") == ("GeForce GTX 1060", "GTX 1060")
+
+def test_resolve_memoizes_benchmark_card_ids_only(resolver_directory):
+    card_name_resolver = CardNameResolver(["Radeon RX 6600"], [])
+    assert card_name_resolver.resolve("AMD Radeon(TM) RX 6600") == ("Radeon RX 6600", "Radeon RX 6600")
+    card_name_resolver.write_cache()
+
+    # The memo still applies once the architecture DB has more cards, and the architecture name follows the new cards
+    card_name_resolver = CardNameResolver(["Radeon RX 6600"], ["RX 6600"])
+    assert card_name_resolver.resolutions == {"AMD Radeon(TM) RX 6600": "Radeon RX 6600"}
+    assert card_name_resolver.resolve("AMD Radeon(TM) RX 6600") == ("Radeon RX 6600", "RX 6600")
+
+def test_resolve_fuzzy_matches_only_names_with_the_same_model_tokens(resolver_directory):
+    card_name_resolver = CardNameResolver(["GeForce RTX 3060", "GeForce RTX 3060 Ti", "GeForce RTX 3060 Laptop GPU", "Radeon RX 6600 XT"], [])
+
+    # Extra or reordered words still match, but never a name with other model numbers or variants
+    assert card_name_resolver.resolve("NVIDIA GeForce RTX 3060 Graphics Card")[0] == "GeForce RTX 3060"
+    assert card_name_resolver.resolve("NVIDIA RTX 3060 Ti GeForce")[0] == "GeForce RTX 3060 Ti"
+    assert card_name_resolver.resolve("AMD Radeon RX 6600")[0] == None
+    assert card_name_resolver.resolve("NVIDIA GeForce RTX 3070")[0] == None
@@ -0,0 +1,166 @@
+import http.server
+import json
+import re
+import threading
+
+import pytest
+
+import gpu_architecture_db
+from cache_store import CacheStore
+from gpu_architecture_db import GPU_ARCHITECTURE_DB_CACHE_FILE, GPUArchitectureDB
+from instrumentation import INSTRUMENTATION
+
+GRAPHQL_SEARCH_PATTERN=re.compile(r'(gpu\d+): search\(query:("(?:[^"\\]|\\.)*")')
+
+# Names the stand-in server knows, each found next to a longer name that only contains it
+KNOWN_CARDS={"RTX 3060": 12, "RTX 3070": 8, "RX 6600": 8, "RX 6700 XT": 12, "GTX 1060": 6}
+
+# Requests searching for any of these names are dropped without a response
+FAILING_CARDS={"Broken Card"}
+
+def card_node(name, memory_size_gb):
+    return {"name": name, "computeUnitCount": 28, "aluCount": 3584, "singlePrecisionPerformance": 12.7, "baseFrequency": 1320000000,
+        "turboFrequency": None, "memoryBusWidth": 192, "memoryFrequency": 1875000000.0, "memorySize": memory_size_gb * 1024 * 1024 * 1024,
+        "memoryType": "GDDR6", "releaseDate": "2021-02-25", "vendor": "NVIDIA", "asic": {"name": "GA106"}}
+
+class GraphQLHandler(http.server.BaseHTTPRequestHandler):
+
+    # Answers each aliased search of a batched GraphQL document under its alias, and records the aliases of every request
+    def do_GET(self):
+        query = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        searches = [(alias, json.loads(name)) for (alias, name) in GRAPHQL_SEARCH_PATTERN.findall(query)]
+        with self.server.lock:
+            self.server.batches.append([name for (alias, name) in searches])
+        if any(name in FAILING_CARDS for (alias, name) in searches):
+            self.close_connection = True
+            return
+
+        data = dict()
+        for alias, name in searches:
+            edges = []
+            if name in KNOWN_CARDS:
+                edges.append({"node": card_node(f"{name} Mobile", KNOWN_CARDS[name])})
+                edges.append({"node": card_node(name, KNOWN_CARDS[name])})
+            data[alias] = {"edges": edges}
+
+        body = json.dumps({"data": data}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def graphql_server(monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GraphQLHandler)
+    server.lock = threading.Lock()
+    server.batches = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(gpu_architecture_db, "GPU_ARCHITECTURE_DB_GRAPHQL_URL", f"http://127.0.0.1:{server.server_address[1]}/graphql")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def gpu_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cache").mkdir()
+    return GPUArchitectureDB()
+
+def test_prefetch_names_batches_and_merges_aliased_searches(graphql_server, gpu_db, monkeypatch):
+    monkeypatch.setattr(gpu_architecture_db, "GPU_ARCHITECTURE_DB_FETCH_BATCH_SIZE", 3)
+    write_cache_calls = []
+    write_cache = gpu_db.write_cache
+    monkeypatch.setattr(gpu_db, "write_cache", lambda: write_cache_calls.append(True) or write_cache())
+
+    unknown_names = ["RTX 9999", "Not A Card"]
+    names = list(KNOWN_CARDS.keys()) + unknown_names
+    gpu_db.prefetch_names(names + ["RTX 3060"])
+
+    # Every name is searched once, at most 3 to a request, each under its own alias
+    assert sorted(name for batch in graphql_server.batches for name in batch) == sorted(names)
+    assert len(graphql_server.batches) == 3
+    assert all(len(batch) <= 3 for batch in graphql_server.batches)
+
+    # Results of all the concurrent requests are merged, matching names exactly rather than the first substring hit
+    for name, memory_size_gb in KNOWN_CARDS.items():
+        found, gpu = gpu_db.cache.get(name)
+        assert found
+        assert gpu.name == name
+        assert gpu.memory_size_bytes == memory_size_gb * 1024 * 1024 * 1024
+    for name in unknown_names:
+        assert gpu_db.cache.get(name) == (True, None)
+
+    # Persisted once, for all names
+    assert len(write_cache_calls) == 1
+    stored = dict(CacheStore(GPU_ARCHITECTURE_DB_CACHE_FILE).items())
+    assert sorted(stored.keys()) == sorted(names)
+    assert all(stored[name].name == name for name in KNOWN_CARDS)
+    assert all(stored[name] == None for name in unknown_names)
+
+def test_prefetch_names_skips_cached_names(graphql_server, gpu_db):
+    gpu_db.prefetch_names(["RTX 3060", "RTX 9999"])
+    graphql_server.batches.clear()
+
+    gpu_db.prefetch_names(["RTX 3060", "RTX 9999", "RX 6600"])
+    assert graphql_server.batches == [["RX 6600"]]
+
+def test_cache_hits_and_misses_are_counted_once_per_name(graphql_server, gpu_db, monkeypatch):
+    monkeypatch.setattr(INSTRUMENTATION, "counters", dict())
+    gpu_db.prefetch_names(["RTX 3060"])
+    gpu_db.prefetch_names(["RTX 3060", "RX 6600", "RTX 9999"])
+    for name in ["RTX 3060", "RX 6600", "RTX 9999"]:
+        gpu_db.get_by_name(name)
+
+    # Each name is counted once, by the first prefetch that looks it up; later lookups of the same names aren't counted again
+    assert INSTRUMENTATION.counters == {"gpu_architecture_db.cache_misses": 3}
+
+    # Names that weren't prefetched are counted on every lookup
+    gpu_db.get_by_name("GTX 1060")
+    gpu_db.get_by_name("GTX 1060")
+    assert INSTRUMENTATION.counters == {"gpu_architecture_db.cache_misses": 4, "gpu_architecture_db.cache_hits": 1}
+
+def test_failed_batch_stays_unknown_for_the_run_without_refetching(graphql_server, gpu_db, monkeypatch):
+    monkeypatch.setattr(gpu_architecture_db, "GPU_ARCHITECTURE_DB_FETCH_BATCH_SIZE", 2)
+    gpu_db.prefetch_names(["RTX 3060", "Broken Card", "RX 6600"])
+    assert len(graphql_server.batches) == 2
+
+    # Names of the failed batch are unknown for the rest of the run, and looking them up again doesn't reach the server
+    assert gpu_db.get_by_name("RTX 3060") == None
+    assert gpu_db.get_by_name("Broken Card") == None
+    assert gpu_db.get_by_name("RX 6600").name == "RX 6600"
+    assert len(graphql_server.batches) == 2
+
+    # Only the batch that was fetched is stored, so the next run looks the others up again
+    assert sorted(dict(CacheStore(GPU_ARCHITECTURE_DB_CACHE_FILE).items()).keys()) == ["RX 6600"]
+    graphql_server.batches.clear()
+    GPUArchitectureDB().prefetch_names(["RTX 3060", "RX 6600"])
+    assert graphql_server.batches == [["RTX 3060"]]
+
+def test_lookups_use_a_snapshot_of_the_current_cache(graphql_server, gpu_db):
+    gpu_db.prefetch_names(["RTX 3060", "RTX 9999"])
+    graphql_server.batches.clear()
+
+    # Cards and unknowns are looked up without reading the whole cache
+    gpu_db = GPUArchitectureDB()
+    assert gpu_db.get_by_name("RTX 3060").memory_size_bytes == 12 * 1024 * 1024 * 1024
+    assert gpu_db.get_by_name("RTX 9999") == None
+    assert gpu_db.cache == None
+    assert graphql_server.batches == []
+
+    # Unknowns past the negative TTL are looked up again, like with the whole cache, and the snapshot then follows the cache
+    gpu_db = GPUArchitectureDB(negative_ttl_days=0.0)
+    assert gpu_db.get_by_name("RTX 3060").name == "RTX 3060"
+    assert graphql_server.batches == []
+    assert gpu_db.get_by_name("RTX 9999") == None
+    assert graphql_server.batches == [["RTX 9999"]]
+    assert gpu_db.get_by_name("RX 6600").name == "RX 6600"
+
+    gpu_db = GPUArchitectureDB()
+    assert gpu_db.cache == None
+    assert gpu_db.get_by_name("RX 6600").name == "RX 6600"
+    assert sorted(gpu_db.card_names()) == ["RTX 3060", "RX 6600"]
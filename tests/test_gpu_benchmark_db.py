@@ -0,0 +1,167 @@
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+import gpu_benchmark_db
+from cache_store import CacheStore
+from gpu_benchmark_db import GPU_BENCHMARK_DB_CACHE_FILE, GPUBenchmarkDB, GPUBenchmarkDBCache, GPUBenchmarkDBEntry, parse_mega_page_data
+from snapshot_store import snapshot_path
+
+# Rows in the layout of the mega page's data endpoint; `python gpu_benchmark_db.py --save-response FILE` saves a live response
+GPU_MEGA_PAGE_DATA_FIXTURE=os.path.join(os.path.dirname(__file__), "fixtures", "gpu_mega_page_data.json")
+
+def read_fixture():
+    with open(GPU_MEGA_PAGE_DATA_FIXTURE, 'rb') as fixture_file:
+        return fixture_file.read()
+
+def test_parse_mega_page_data_reads_every_row():
+    results = parse_mega_page_data(json.loads(read_fixture()))
+    assert len(results) == 10
+
+    # Card ids follow the Steam naming, while entries keep the PassMark name
+    rtx_4090 = results["NVIDIA GeForce RTX 4090"]
+    assert (rtx_4090.name, rtx_4090.g3d_mark, rtx_4090.g2d_mark) == ("GeForce RTX 4090", 38172, 1300)
+    assert results["AMD Radeon RX 7900 XTX"].g2d_mark == 1273
+    assert results["Intel HD Graphics 4000"].name == "Intel HD 4000"
+    assert results["@oem27.inf,%winmv2%;mv video hook driver2"].g3d_mark == 1707
+
+def test_parse_mega_page_data_skips_rows_without_both_marks():
+    results = parse_mega_page_data({"data": [{"name": "GeForce  RTX 4090 ", "g3d": 38172, "g2d": "1,300"}, {"name": "GeForce RTX 5090", "g3d": "NA", "g2d": "1,400"}, {"name": "Radeon RX 6600", "g3d": "15,084"}]})
+    assert list(results.keys()) == ["NVIDIA GeForce RTX 4090"]
+    assert results["NVIDIA GeForce RTX 4090"].name == "GeForce RTX 4090"
+
+class MegaPageHandler(http.server.BaseHTTPRequestHandler):
+
+    # Serves the page with a session cookie, and the data only to requests that carry it, like the page's own script
+    def do_GET(self):
+        with self.server.lock:
+            self.server.paths.append(self.path)
+        if self.path == "/GPU_mega_page.html":
+            self.respond(200, b"<html></html>", [("Set-Cookie", "PHPSESSID=session")])
+        elif self.path == "/data/" and self.server.data_status == 200 and "PHPSESSID=session" in self.headers.get("Cookie", "") and self.headers.get("X-Requested-With") == "XMLHttpRequest":
+            self.respond(200, read_fixture(), [("Content-Type", "application/json")])
+        else:
+            self.respond(self.server.data_status if self.server.data_status != 200 else 403, b"", [])
+
+    def respond(self, status, body, headers):
+        self.send_response(status)
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def mega_page_server(monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MegaPageHandler)
+    server.lock = threading.Lock()
+    server.paths = []
+    server.data_status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(gpu_benchmark_db, "GPU_BENCHMARK_DB_MEGA_PAGE_URL", f"{url}/GPU_mega_page.html")
+    monkeypatch.setattr(gpu_benchmark_db, "GPU_BENCHMARK_DB_MEGA_PAGE_DATA_URL", f"{url}/data/")
+    monkeypatch.setattr(gpu_benchmark_db, "GPU_BENCHMARK_DB_FETCH_BACKEND", "http")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def selenium_fetches(monkeypatch):
+    fetches = []
+    def fetch_from_server_selenium():
+        fetches.append(True)
+        return GPUBenchmarkDBCache({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38172, 1300)})
+    monkeypatch.setattr(GPUBenchmarkDB, "fetch_from_server_selenium", staticmethod(fetch_from_server_selenium))
+    return fetches
+
+def test_fetch_from_server_reads_the_data_endpoint_without_a_browser(mega_page_server, selenium_fetches):
+    cache = GPUBenchmarkDB.fetch_from_server()
+    assert len(cache.entries) == 10
+    assert cache.get("AMD Radeon RX 6600").g3d_mark == 15084
+    assert mega_page_server.paths == ["/GPU_mega_page.html", "/data/"]
+    assert selenium_fetches == []
+
+def test_fetch_from_server_falls_back_to_selenium(mega_page_server, selenium_fetches):
+    mega_page_server.data_status = 503
+    cache = GPUBenchmarkDB.fetch_from_server()
+    assert list(cache.entries.keys()) == ["NVIDIA GeForce RTX 4090"]
+    assert selenium_fetches == [True]
+
+def test_fetch_from_server_uses_selenium_when_asked_to(mega_page_server, selenium_fetches, monkeypatch):
+    monkeypatch.setattr(gpu_benchmark_db, "GPU_BENCHMARK_DB_FETCH_BACKEND", "selenium")
+    GPUBenchmarkDB.fetch_from_server()
+    assert mega_page_server.paths == []
+    assert selenium_fetches == [True]
+
+@pytest.fixture
+def fetched_pages(tmp_path, monkeypatch):
+
+    # Each fetch of the mega page returns the next of the pages appended to the list
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cache").mkdir()
+    pages = []
+    fetches = []
+    def fetch_from_server():
+        fetches.append(True)
+        return GPUBenchmarkDBCache(dict(pages[len(fetches) - 1]))
+    monkeypatch.setattr(GPUBenchmarkDB, "fetch_from_server", staticmethod(fetch_from_server))
+    return pages, fetches
+
+def test_refresh_after_fetching_on_open_does_not_fetch_again(fetched_pages):
+    pages, fetches = fetched_pages
+    pages.append({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38195, 1320)})
+
+    gpu_benchmark_db = GPUBenchmarkDB()
+    assert gpu_benchmark_db.refresh(force=True)
+    assert len(fetches) == 1
+
+def test_refresh_drops_cards_the_page_no_longer_lists(fetched_pages):
+    pages, fetches = fetched_pages
+    pages.append({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38195, 1320), "Intel HD Graphics 4000": GPUBenchmarkDBEntry("Intel HD 4000", 433, 148)})
+    pages.append({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38200, 1321)})
+    GPUBenchmarkDB()
+
+    gpu_benchmark_db = GPUBenchmarkDB()
+    assert not gpu_benchmark_db.refresh()
+    assert gpu_benchmark_db.refresh(force=True)
+    assert len(fetches) == 2
+
+    stored = dict(CacheStore(GPU_BENCHMARK_DB_CACHE_FILE).items())
+    assert list(stored.keys()) == ["NVIDIA GeForce RTX 4090"]
+    assert stored["NVIDIA GeForce RTX 4090"].g3d_mark == 38200
+    assert list(GPUBenchmarkDB().card_ids()) == ["NVIDIA GeForce RTX 4090"]
+
+def test_lookups_use_a_snapshot_of_the_current_cache(fetched_pages):
+    pages, fetches = fetched_pages
+    pages.append({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38195, 1320), "Intel HD Graphics 4000": GPUBenchmarkDBEntry("Intel HD 4000", 433, 148)})
+    pages.append({"NVIDIA GeForce RTX 4090": GPUBenchmarkDBEntry("GeForce RTX 4090", 38200, 1321)})
+    GPUBenchmarkDB()
+    with open(snapshot_path(GPU_BENCHMARK_DB_CACHE_FILE), 'rb') as snapshot_file:
+        first_snapshot = snapshot_file.read()
+
+    # Looked up without reading the whole cache, which is only read once all card ids are needed
+    gpu_benchmark_db = GPUBenchmarkDB()
+    assert gpu_benchmark_db.get("NVIDIA GeForce RTX 4090").g3d_mark == 38195
+    assert gpu_benchmark_db.get("AMD Radeon RX 6600") == None
+    assert gpu_benchmark_db.cache == None
+    assert sorted(gpu_benchmark_db.card_ids()) == ["Intel HD Graphics 4000", "NVIDIA GeForce RTX 4090"]
+
+    # A snapshot of an earlier version of the cache is ignored, and replaced
+    GPUBenchmarkDB().refresh(force=True)
+    with open(snapshot_path(GPU_BENCHMARK_DB_CACHE_FILE), 'wb') as snapshot_file:
+        snapshot_file.write(first_snapshot)
+    gpu_benchmark_db = GPUBenchmarkDB()
+    assert gpu_benchmark_db.cache != None
+    assert gpu_benchmark_db.get("NVIDIA GeForce RTX 4090").g3d_mark == 38200
+    gpu_benchmark_db = GPUBenchmarkDB()
+    assert gpu_benchmark_db.cache == None
+    assert gpu_benchmark_db.get("NVIDIA GeForce RTX 4090").g3d_mark == 38200
+    assert gpu_benchmark_db.get("Intel HD Graphics 4000") == None
@@ -0,0 +1,113 @@
+import math
+import os
+import threading
+
+import pytest
+
+from snapshot_store import Snapshot, write_snapshot
+
+COLUMNS=[("name", "str"), ("count", "int"), ("ratio", "float")]
+
+class Record:
+    def __init__(self, name, count, ratio):
+        self.name = name
+        self.count = count
+        self.ratio = ratio
+
+    def values(self):
+        return (self.name, self.count, self.ratio)
+
+def typed_values(record):
+    return [(type(value), value) for value in record.values()]
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    return str(tmp_path / "records.snapshot")
+
+def test_records_read_back_with_the_same_values_and_types(snapshot_file):
+    records = [("a", Record("Ärger", 2**63 - 1, 1.5), 100.0), ("b", Record(None, -2**63, None), 200.0), ("missing", None, 300.0), ("c", Record("", 0, 0.0), None)]
+    write_snapshot(snapshot_file, "v1", COLUMNS, records)
+
+    snapshot = Snapshot.open(snapshot_file, "v1", Record)
+    assert len(snapshot) == 4
+    for key, record, fetched_at in records:
+        found, value, snapshot_fetched_at = snapshot.lookup(key)
+        assert found
+        if record == None:
+            assert value == None
+        else:
+            assert typed_values(value) == typed_values(record)
+        assert snapshot_fetched_at == fetched_at or (fetched_at == None and math.isnan(snapshot_fetched_at))
+    assert snapshot.lookup("d") == (False, None, None)
+
+    # Records without a fetch time are never older than a cutoff, like in the store
+    assert snapshot.fetched_before(250.0) == [("a", True), ("b", True)]
+    snapshot.close()
+
+def test_nan_and_none_floats_stay_apart(snapshot_file):
+    write_snapshot(snapshot_file, "v1", COLUMNS, [("nan", Record("x", 1, math.nan), 0.0), ("none", Record("x", 1, None), 0.0)])
+    snapshot = Snapshot.open(snapshot_file, "v1", Record)
+    assert math.isnan(snapshot.lookup("nan")[1].ratio)
+    assert snapshot.lookup("none")[1].ratio == None
+
+def test_many_keys_are_all_found(snapshot_file):
+    records = [(f"Card {index}", Record(f"Card {index}", index, index / 7), float(index)) for index in range(5000)]
+    write_snapshot(snapshot_file, "v1", COLUMNS, records)
+    snapshot = Snapshot.open(snapshot_file, "v1", Record)
+    assert all(snapshot.lookup(key)[1].count == record.count for (key, record, fetched_at) in records)
+    assert snapshot.lookup("Card 5000") == (False, None, None)
+
+@pytest.mark.parametrize("record", [Record("x", 1.0, 1.0), Record("x", True, 1.0), Record("x", 1, 1), Record(1, 1, 1.0), Record("x", 2**63, 1.0)])
+def test_values_that_would_not_read_back_the_same_are_rejected(snapshot_file, record):
+    write_snapshot(snapshot_file, "v1", COLUMNS, [("a", Record("x", 1, 1.0), 0.0)])
+
+    with pytest.raises(ValueError):
+        write_snapshot(snapshot_file, "v2", COLUMNS, [("a", record, 0.0)])
+
+    # The previous snapshot is left in place, without temporary files next to it
+    assert Snapshot.open(snapshot_file, "v1", Record) != None
+    assert os.listdir(os.path.dirname(snapshot_file)) == [os.path.basename(snapshot_file)]
+
+def test_snapshots_of_another_version_or_damaged_are_not_used(snapshot_file):
+    assert Snapshot.open(snapshot_file, "v1", Record) == None
+
+    write_snapshot(snapshot_file, "v1", COLUMNS, [("a", Record("x", 1, 1.0), 0.0)])
+    assert Snapshot.open(snapshot_file, "v2", Record) == None
+
+    with open(snapshot_file, 'rb') as file:
+        data = file.read()
+    for damaged_data in [data[:-1], data[:10], b"", b"not a snapshot" * 10]:
+        with open(snapshot_file, 'wb') as file:
+            file.write(damaged_data)
+        assert Snapshot.open(snapshot_file, "v1", Record) == None
+
+def test_readers_keep_their_snapshot_while_writers_replace_it(snapshot_file):
+    write_snapshot(snapshot_file, "v0", COLUMNS, [(f"Card {index}", Record("v0", index, 0.0), 0.0) for index in range(100)])
+    first_snapshot = Snapshot.open(snapshot_file, "v0", Record)
+
+    # Writers race to replace the file, while readers keep opening whatever is in place
+    # Every snapshot a reader opens must be whole, with all of its records from the same version
+    errors = []
+
+    def write(writer):
+        for iteration in range(20):
+            version = f"v{writer}.{iteration}"
+            write_snapshot(snapshot_file, version, COLUMNS, [(f"Card {index}", Record(version, index, 0.0), 0.0) for index in range(100)])
+
+    def read():
+        for iteration in range(50):
+            snapshot = Snapshot(snapshot_file, Record)
+            names = set(snapshot.lookup(f"Card {index}")[1].name for index in range(100))
+            if names != {snapshot.source_version}:
+                errors.append(names)
+            snapshot.close()
+
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(4)] + [threading.Thread(target=read) for reader in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(first_snapshot.lookup(f"Card {index}")[1].name == "v0" for index in range(100))
+    assert os.listdir(os.path.dirname(snapshot_file)) == [os.path.basename(snapshot_file)]
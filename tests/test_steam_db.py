@@ -0,0 +1,85 @@
+import http.server
+import os
+import threading
+
+import pytest
+
+import steam_db
+from steam_db import STEAM_DB_CSV_FILE, STEAM_DB_VIDEO_CARD_CATEGORY, SteamSurveyIndex
+
+# Two versions of the survey CSV, one per concurrent download, each long enough to be written over many chunks
+CSV_VERSIONS=["".join(f'2025-08-01,{STEAM_DB_VIDEO_CARD_CATEGORY},"Card {version}-{index}",0.0,0.001\n' for index in range(2000)).encode("utf-8") for version in range(2)]
+
+class SurveyHandler(http.server.BaseHTTPRequestHandler):
+
+    # Serves a different CSV version to each request, in two halves, and waits for every other download to be halfway through before finishing
+    # A truncated response announces the full length, then drops the connection after the first half
+    def do_GET(self):
+        with self.server.lock:
+            body = CSV_VERSIONS[self.server.request_count % len(CSV_VERSIONS)]
+            self.server.request_count += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:len(body) // 2])
+        self.wfile.flush()
+        if self.server.truncate:
+            self.close_connection = True
+            return
+        self.server.barrier.wait(timeout=10)
+        self.wfile.write(body[len(body) // 2:])
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def survey_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cache").mkdir()
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SurveyHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.barrier = threading.Barrier(1)
+    server.truncate = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(steam_db, "STEAM_DB_CSV_URL", f"http://127.0.0.1:{server.server_address[1]}/shs.csv")
+    monkeypatch.setattr(steam_db, "STEAM_DB_DOWNLOAD_CHUNK_SIZE", 1024)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def temporary_files():
+    return [file_name for file_name in os.listdir("cache") if file_name.endswith(".tmp")]
+
+def test_concurrent_refreshes_install_one_whole_csv(survey_server):
+    survey_server.barrier = threading.Barrier(2)
+    errors = []
+
+    def refresh():
+        try:
+            SteamSurveyIndex().refresh()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(STEAM_DB_CSV_FILE, 'rb') as csv_file:
+        assert csv_file.read() in CSV_VERSIONS
+    assert temporary_files() == []
+
+def test_failed_download_leaves_no_temporary_file(survey_server):
+    survey_server.truncate = True
+
+    with pytest.raises(Exception):
+        SteamSurveyIndex().refresh()
+
+    assert not os.path.exists(STEAM_DB_CSV_FILE)
+    assert temporary_files() == []
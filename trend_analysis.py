@@ -0,0 +1,62 @@
+import csv
+import numpy
+
+from card_table import target_chunks
+from steam_db import STEAM_DB_VIDEO_CARD_CATEGORY
+
+TREND_FILE="output/trend.csv"
+
+class SurveyTrend:
+    def __init__(self, survey_index, other_card_id="Other"):
+
+        # Date x card popularity matrix over every month in the survey
+        # Like SteamDB.remove(), the "Other" category is dropped and the remaining cards renormalized, month by month
+        self.dates = survey_index.dates()
+        self.card_ids = []
+        card_positions = dict()
+
+        monthly_rows = [survey_index.get(date, STEAM_DB_VIDEO_CARD_CATEGORY) for date in self.dates]
+        for rows in monthly_rows:
+            for name, popularity in rows:
+                if name != other_card_id and not name in card_positions:
+                    card_positions[name] = len(self.card_ids)
+                    self.card_ids.append(name)
+
+        self.popularity = numpy.zeros((len(self.dates), len(self.card_ids)))
+        for date_position, rows in enumerate(monthly_rows):
+            other_popularity = 0.0
+            for name, popularity in rows:
+                if name == other_card_id:
+                    other_popularity = popularity
+                else:
+                    self.popularity[date_position, card_positions[name]] = popularity
+            # A month with nothing but "Other" has no card popularity to renormalize
+            if other_popularity < 1.0:
+                self.popularity[date_position] *= 1.0 / (1.0 - other_popularity)
+
+def analyze_trend(survey_trend, target_requirements, card_table):
+
+    # card_table must include every card surveyed in any month, joined by create_cards() like in a single month analysis
+    # target_requirements is [(target configuration, requirements)], with None as the requirements of targets that can't be analyzed
+    popularity = numpy.zeros((len(survey_trend.dates), len(card_table)))
+    popularity[:, [card_table.positions[card_id] for card_id in survey_trend.card_ids]] = survey_trend.popularity
+
+    # targets x cards eligibility a chunk of targets at a time, each times the popularity matrix for dates x targets coverage
+    target_configurations = [target_configuration for (target_configuration, requirements) in target_requirements]
+    analyzed_positions = numpy.array([position for (position, (target_configuration, requirements)) in enumerate(target_requirements) if requirements != None], dtype=numpy.int64)
+    requirements_list = [requirements for (target_configuration, requirements) in target_requirements if requirements != None]
+    coverage = numpy.full((len(survey_trend.dates), len(target_configurations)), numpy.nan)
+    for chunk in target_chunks(len(requirements_list), len(card_table)):
+        coverage[:, analyzed_positions[chunk]] = popularity @ card_table.eligibility(requirements_list[chunk]).T.astype(numpy.float64)
+
+    return target_configurations, coverage
+
+def write_trend_csv(survey_trend, target_configurations, coverage):
+
+    with open(TREND_FILE, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["Date"] + [target_configuration.name for target_configuration in target_configurations])
+        for date_position, date in enumerate(survey_trend.dates):
+            writer.writerow([date] + [f"{market_share * 100:.2f}%" if not numpy.isnan(market_share) else None for market_share in coverage[date_position]])
+
+    print(f"Results written to {TREND_FILE}")